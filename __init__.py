@@ -1,5 +1,25 @@
-__all__ = ['flh', 'imp']
+__all__ = ['flh', 'fsi', 'imp', 'ins', 'lut', 'rst', 'sc', 'scat', 'sr']
 
-import flap_field_lines.field_line_handler as flh
-import flap_field_lines.image_projector as imp
+import importlib
 
+#submodules by alias, imported when first accessed, so importing the package
+#or one of its modules does not import all the others
+submodules = {'flh': 'field_line_handler',
+              'fsi': 'flux_surface_info',
+              'imp': 'image_projector',
+              'ins': 'instrumentation',
+              'lut': 'lookup_table',
+              'rst': 'rasterizer',
+              'sc': 'surface_cache',
+              'scat': 'surface_catalog',
+              'sr': 'sav_reader'}
+
+def __getattr__(name):
+    if name not in submodules:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    module = importlib.import_module('.' + submodules[name], __name__)
+    globals()[name] = module
+    return module
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -23,3 +23,8 @@ class WrongDirectionError(Exception):
         self.message = f'Direction of field lines should be "forward", \
                         "backward" or "both"!'
         super().__init__(self.message)
+
+class SavFormatError(Exception):
+    def __init__(self, message='Unsupported IDL save file format.'):
+        self.message = message
+        super().__init__(self.message)
@@ -8,9 +8,17 @@ Created on Tue May 31 2021
 import numpy as np
 import os
 
-from scipy.io import readsav
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import islice, repeat
 
 from .errors import *
+from .flux_surface_info import read_fs_info
+from .instrumentation import stage
+from .surface_catalog import surface_catalog, surface_number
+from .surface_cache import (CachedSurface, cache_file_name, decode_surface_file, 
+                            is_cache_valid, open_surface_file, shared_cache)
 
 class FieldLineHandler:
     """
@@ -37,12 +45,16 @@ class FieldLineHandler:
 
     def __init__(self, 
                  path=None, 
-                 configuration=None):
+                 configuration=None,
+                 cache_dir=None):
         """
         Constructor. Inputs:
         path: path to fs_info.sav. If None is given, default vaue is used
         configuration: W7X magnetic config name. Currently there are 3 valid 
                        options.
+        cache_dir: where to look for the .npy cache of the surface files (see 
+                   surface_cache). If None, they are looked for next to the 
+                   surface files.
         
         Raises: NoFsInfoError and WrongConfigurationError.
         """
@@ -65,34 +77,19 @@ class FieldLineHandler:
         if os.path.exists(os.path.join(self.path, 'field_lines')):
             self.path = os.path.join(self.path, 'field_lines')
         self.configuration = configuration
-        self.__fs_info = self.__read_fs_info(path)
-        self.__field_lines = None
-        self.__B = None
-        self.__gradB = None
+        self.cache_dir = cache_dir
+        self.__fs_info = read_fs_info(path)
         self.surfaces = []
         self.surface_files = []
-        self.read_files = []
         self.lines = None
         self.tor_range = None
         self.direction = None
-
-    def __read_fs_info(self, file):
-        '''
-        Reads data from fs_info file. It takes the iota of each eligible flux 
-        surface for the given magnetic configuration. Effective radius of the 
-        surfaces. The surface number of the separatrix for the main plasma and 
-        islands. Names of the islands. Flag of which surfaces belongs to which 
-        island.
-        '''
-        fs_info = readsav(file)
-        needed_info = {}
-        needed_info['iota'] = fs_info['fs_info'][0][3]
-        needed_info['reff'] = fs_info['fs_info'][0][4]
-        needed_info['separatrix'] = fs_info['fs_info'][0][6]
-        needed_info['names'] = fs_info['fs_info'][0][7]
-        needed_info['names'][0] = b'main plasma'
-        needed_info['flags'] = fs_info['fs_info'][0][8]
-        return needed_info
+        #the selections set by default, to tell them from given ones
+        self.__default_lines = None
+        self.__default_tor = None
+        #type of the loaded data, None for the type of the files
+        self.dtype = None
+        self.drop_data()
 
     def update_read_parameters(self, 
                  path=None, 
@@ -133,14 +130,25 @@ class FieldLineHandler:
         direction: which direction of field lines to read. Can be 
             forward, backward or both
         drop_data: overwrite if True or extend existing data if False
+
+        Loaded data is kept for the surfaces that stay selected. A change of 
+        lines, tor_range or direction is served from memory by load_data() 
+        if the loaded data covers the new selection, otherwise the affected 
+        surfaces are read again.
         """
-        if direction in ('forward', 'backward', 'both'):
-            #if the direction is changed, drop existing data and reread all
-            if direction != self.direction:
-                self.drop_data()
-                self.direction = direction
-        else:
+        if direction not in ('forward', 'backward', 'both'):
             raise WrongDirectionError
+        #a new selection asks only for field lines again, as reading does, but 
+        #the loaded quantities are kept for reuse
+        if drop_data or direction != self.direction:
+            self.__requested = {4}
+        if direction != self.direction:
+            #defaults are derived again for the new direction
+            if self.lines is self.__default_lines:
+                self.lines = None
+            if self.tor_range is self.__default_tor:
+                self.tor_range = None
+        self.direction = direction
 
         if path:
             #if path is given, self.path is overwritten
@@ -165,7 +173,7 @@ class FieldLineHandler:
         elif not self.surfaces:
             #if surfaces is not specified and there are no surfaces already 
             #selected, select all according to fs_info
-            surf_files, surfaces = self.create_surf_file_list(range(len(self.__fs_info['iota'])))
+            surf_files, surfaces = self.create_surf_file_list(range(len(self.__fs_info)))
         else:
             #if nothing is given and there are already selected surfaces, do 
             #nothing
@@ -174,208 +182,899 @@ class FieldLineHandler:
 
         if drop_data:
             if surfaces:
-                self.surfaces = surfaces
-                self.surface_files = surf_files
-            self.drop_data()
+                self.__select_surfaces(surfaces, surf_files)
         else:
             #extend the list of files to read if drop_data is False
-            self.surfaces += surfaces
-            self.surface_files += surf_files
-            self.read_files += [True for i in range(len(surfaces))]
+            self.__select_surfaces(self.surfaces + surfaces, 
+                                   self.surface_files + surf_files)
 
-        #if new lines or range is to be read, drop all data and reread it along 
-        #with the new data
         if lines:
             lines = process_selection(lines)
             if lines != self.lines:
                 self.lines = lines
-                self.drop_data()
+                self.__requested = {4}
 
         if tor_range:
             tor_range = process_selection(tor_range)
             if tor_range != self.tor_range:
                 self.tor_range = tor_range
-                self.drop_data()
-
-    def load_data(self, getB=False, getGradB=False):
-        if self.__B is not None:
-            getB = True
-        elif getB:
-            self.drop_data()
-
-        if self.__gradB is not None:
-            getGradB = True
-        elif getGradB:
-            self.drop_data()
-        
-        first = self.read_files.index(True)
+                self.__requested = {4}
 
-        field_lines, B, grad_B = self.__read_surf_files(first, getB, getGradB)
+        self.__views = {}
 
-        if first == 0:
-            self.__field_lines = field_lines
-            self.__B = B
-            self.__gradB = grad_B
-        else:
-            if self.__field_lines.ndim < field_lines.ndim:
-                self.__field_lines = self.__field_lines[..., np.newaxis]
-                if self.__B is not None:
-                    self.__B = self.__B[..., np.newaxis]
-                if self.__gradB is not None:
-                    self.__gradB = self.__gradB[..., np.newaxis]
-
-            self.__field_lines = np.concatenate((self.__field_lines, 
-                                                 field_lines), axis=-1)
-            if getB:
-                self.__B = np.concatenate((self.__B, B), axis=-1)
-            if getGradB:
-                self.__gradB = np.concatenate((self.__gradB, grad_B), axis=-1)
-
-        self.read_files[first:] = [False for i in range(first,len(self.surfaces))]
+    def __select_surfaces(self, surfaces, surf_files):
+        """
+        Sets the selected surfaces. Data already loaded for surfaces that 
+        stay selected is kept and moved to their new position.
+        """
+        if surf_files != self.surface_files:
+            old = {file: i for i, file in enumerate(self.surface_files)}
+            count = len(surf_files)
+            for index_no, data in self.__data.items():
+                loaded = [False for i in range(count)]
+                kept = [(i, old[file]) for i, file in enumerate(surf_files) 
+                        if file in old and self.__loaded[index_no][old[file]]]
+                if kept:
+                    if data.ndim == 3:
+                        data = data[..., np.newaxis]
+                    new = np.empty(data.shape[:3] + (count,), dtype=data.dtype)
+                    for i, j in kept:
+                        new[..., i] = data[..., j]
+                        loaded[i] = True
+                    #a single surface has no surface axis
+                    data = new if count > 1 else new[..., 0]
+                else:
+                    data = None
+                self.__data[index_no] = data
+                self.__loaded[index_no] = loaded
+        self.surfaces = surfaces
+        self.surface_files = surf_files
 
-    def drop_data(self):
-        self.read_files = [True for i in range(len(self.surfaces))]
-        self.__field_lines = None
-        self.__B = None
-        self.__gradB = None
-    
-    def create_surf_file_list(self, surfs):
-        file = os.path.join(self.path, 'field_lines_tor_ang_1.85_1turn_%s+252_w_o_limiters_w_o_torsion_w_characteristics_surf_')
-        file = file % self.configuration + '%s.sav'
-        file_list = []
-        surf_list = []
+    def load_data(self, getB=False, getGradB=False, workers=None, 
+                  pool='process', dtype=None):
+        """
+        Reads the selected surface files. Field line coordinates are always 
+        read, the magnetic field and its gradient only if requested or if 
+        they were already loaded before. Only what is missing is read: 
+        surfaces added with drop_data=False are appended to the already 
+        loaded data, and requesting B or gradB later reads only those.
 
-        if surfs is None:
-            surfs = range(len(self.return_fs_info()['iota']))
-
-        for i in surfs:
-            string_no = str(i)
-            if i < 10:
-                string_no = '00' + string_no
-            elif i < 100:
-                string_no = '0' + string_no
-            if os.path.isfile(file % string_no):
-                file_list.append(file % string_no)
-                surf_list.append(i)
-        
-        return file_list, surf_list
+        Loaded data is kept for a superset of the selected lines and toroidal 
+        bins (in both directions), so narrowing the selection or switching 
+        between directions it covers needs no reading. If the selection 
+        grows beyond it, it is extended and the surfaces are read again.
 
-    def create_surf_list(self, file_list):
-        surfs = []
-        for i in file_list:
-            surfs.append(int(i.split('_')[-1][0:3]))
-        return surfs
-
-    def __read_surf_files(self, index, get_B=False, get_gradB=False):
-        surf = readsav(self.surface_files[index])
-         #if no lines are specified, chooses all
+        parameters:
+        getB, getGradB: whether to read the magnetic field and its gradient
+        workers: number of workers decoding surface files in parallel. None 
+            or 1 reads the files one after another in this process.
+        pool: 'process' or 'thread', the kind of pool used if workers > 1
+        dtype: type to store the data in, e.g. np.float32 to halve memory. 
+            It is kept for later loads. None keeps the current type, which 
+            is that of the files (float64) by default. Loaded data is 
+            converted to a narrower type, and read again for a wider one.
+        """
+        with stage('load_data') as measured:
+            surfs, missing = self.__missing_data(getB, getGradB, dtype)
+            measured.record(surfaces=len(surfs))
+            if surfs:
+                self.__read_surf_files(surfs, missing, workers, pool)
+                for i, index_nos in zip(surfs, missing):
+                    for index_no in index_nos:
+                        self.__loaded[index_no][i] = True
+            self.__views = {}
+
+    async def load_data_async(self, getB=False, getGradB=False, dtype=None, 
+                              progress=None, executor=None):
+        """
+        Coroutine version of load_data(), which reads the files in 
+        'executor' (a thread pool, the default executor of the event loop if 
+        None) one surface at a time, so the event loop is never blocked. A 
+        conversion of the loaded data to 'dtype' runs in 'executor' too. 
+        'progress' is called with (surfaces done, surfaces to read, surface 
+        number) after each surface. If the task is cancelled, the surface 
+        being read is finished first, so the handler keeps every surface 
+        read until then. The selection should not be changed while loading.
+        """
+        #asyncio is imported only by the coroutines, which run when it is 
+        #loaded already, to keep importing this module fast
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        #converting loaded data to 'dtype' can take long too
+        surfs, missing = await loop.run_in_executor(executor, self.__missing_data, 
+                                                    getB, getGradB, dtype)
+        for done, (i, index_nos) in enumerate(zip(surfs, missing), 1):
+            future = loop.run_in_executor(executor, self.__read_surface, i, 
+                                          index_nos)
+            try:
+                await asyncio.shield(future)
+            except asyncio.CancelledError:
+                await future
+                raise
+            if progress is not None:
+                progress(done, len(surfs), self.surfaces[i])
+        self.__views = {}
+
+    def __missing_data(self, getB, getGradB, dtype):
+        """
+        Sets up a load: the type and the requested quantities. Returns the 
+        indices of the surfaces with missing quantities and the record 
+        fields of those quantities for each.
+        """
+        if dtype is not None and np.dtype(dtype) != self.dtype:
+            self.__set_dtype(np.dtype(dtype))
+        if getB:
+            self.__requested.add(10)
+        if getGradB:
+            self.__requested.add(16)
+        index_nos = sorted(self.__requested)
+
+        if self.__shape is not None:
+            self.__update_cache_selection()
+
+        #quantities missing for each surface
+        missing = [[index_no for index_no in index_nos 
+                    if not self.__loaded[index_no][i]] 
+                   for i in range(len(self.surface_files))]
+        surfs = [i for i in range(len(missing)) if missing[i]]
+        return surfs, [missing[i] for i in surfs]
+
+    def __read_surface(self, surf, index_nos):
+        """
+        Reads the quantities 'index_nos' of one surface and marks them loaded.
+        """
+        self.__read_surf_files([surf], [index_nos])
+        for index_no in index_nos:
+            self.__loaded[index_no][surf] = True
+        self.__views = {}
+
+    def __set_dtype(self, dtype):
+        for index_no, data in self.__data.items():
+            if data is not None:
+                if np.can_cast(dtype, data.dtype):
+                    self.__data[index_no] = data.astype(dtype, copy=False)
+                else:
+                    self.__data[index_no] = None
+                    self.__loaded[index_no] = [False for i in self.surface_files]
+        self.dtype = dtype
+        self.__views = {}
+
+    @property
+    def read_files(self):
+        """
+        List of bools, True for surfaces whose field lines are not loaded yet.
+        """
+        return [not loaded for loaded in self.__loaded[4]]
+
+    def drop_data(self):
+        #loaded data and which surfaces it is loaded for, by the record field 
+        #of the quantity: field lines, B and gradB
+        self.__data = {4: None, 10: None, 16: None}
+        self.__requested = {4}
+        self.__loaded = {index_no: [False for i in range(len(self.surface_files))] 
+                         for index_no in self.__data}
+        #shape and type of the arrays in the surface files, lines and toroidal 
+        #bins the data is loaded for, and the loaded data in the current 
+        #selection
+        self.__shape = None
+        self.__file_dtype = None
+        self.__cache_lines = None
+        self.__cache_tor = None
+        self.__views = {}
+
+    def __set_default_selection(self):
+        """
+        Selects all lines and toroidal bins of the surfaces if they were not 
+        specified.
+        """
+        #if no lines are specified, chooses all
         if self.lines is None:
-            self.lines = range(len(surf['surface'][0][4]))
+            self.lines = range(self.__shape[0])
+            self.__default_lines = self.lines
 
         #if no toroidal range is specified, chooses all
         if self.tor_range is None:
             if self.direction == 'both':
-                self.tor_range = range(2*len(surf['surface'][0][4][0]))
+                self.tor_range = range(2*self.__shape[1])
             else:
-                self.tor_range = range(len(surf['surface'][0][4][0]))
+                self.tor_range = range(self.__shape[1])
+            self.__default_tor = self.tor_range
 
-        field_lines = self.__extract_data_from_surf(surf, 4)
+    def __update_cache_selection(self):
+        """
+        Makes the lines and toroidal bins of the loaded data cover the 
+        current selection. If they do not, the new lines and bins are added 
+        and the loaded data is dropped, so that it is read again.
+        """
+        self.__set_default_selection()
+        lines = normalize_indices(self.lines, self.__shape[0])
+        tor = tor_to_cache(self.tor_range, self.direction, self.__shape[1])
+        if self.__cache_lines is None:
+            self.__cache_lines, self.__cache_tor = lines, tor
+        elif (selection_positions(self.__cache_lines, lines) is None or 
+              selection_positions(self.__cache_tor, tor) is None):
+            self.__cache_lines = selection_union(self.__cache_lines, lines)
+            self.__cache_tor = selection_union(self.__cache_tor, tor)
+            for index_no in self.__data:
+                self.__data[index_no] = None
+                self.__loaded[index_no] = [False for i in self.surface_files]
 
-        if get_B:
-            B = self.__extract_data_from_surf(surf, 10)
-        else:
-            B = None
+    def create_surf_file_list(self, surfs):
+        """
+        Returns the files of the surfaces in 'surfs' (all surfaces of 
+        fs_info if None) that exist in self.path, and their numbers. The 
+        directory is looked up in its SurfaceCatalog.
+        """
+        if surfs is None:
+            surfs = range(len(self.return_fs_info()))
+        return surface_catalog(self.path).files(self.configuration, surfs, 
+                                                self.path)
+
+    def create_surf_list(self, file_list):
+        return [surface_number(file) for file in file_list]
 
-        if get_gradB:
-            gradB = self.__extract_data_from_surf(surf, 16)
+    def __read_surf_files(self, surfs, quantities, workers=None, 
+                          pool='process'):
+        """
+        Reads surface files with the indices in 'surfs'. 'quantities' holds 
+        the record field of each quantity to be read from the corresponding 
+        file. The output shape and type are known once the first file is 
+        opened, so each quantity is allocated only once for all selected 
+        surfaces, and every surface is extracted directly into its slot along 
+        the last axis. The rest of the files are decoded by a pool of 
+        'workers' if more than one is requested. Threads write into the 
+        output too, results of worker processes are copied into it. The 
+        output is the same as that of the sequential read.
+        """
+        with stage('read_surface', file=self.surface_files[surfs[0]]):
+            record = None
+            if self.__shape is None:
+                #the first file tells the shape of the data
+                fields = surface_fields(quantities[0], self.direction)
+                record = open_surface_quantities(self.surface_files[surfs[0]], 
+                                                 quantities[0], self.direction, 
+                                                 self.cache_dir)
+                self.__shape = record[fields[0]].shape
+                self.__update_cache_selection()
+            direction, tor = cache_to_tor(self.__cache_tor, self.__shape[1])
+            if record is None:
+                record = open_surface_quantities(self.surface_files[surfs[0]], 
+                                                 quantities[0], direction, 
+                                                 self.cache_dir)
+            self.__file_dtype = record[surface_fields(quantities[0][:1], 
+                                                      direction)[0]].dtype
+            self.__file_dtype = self.__file_dtype.newbyteorder('=')
+            dtype = self.__file_dtype if self.dtype is None else self.dtype
+            outputs = self.__allocate_outputs(set().union(*quantities), tor, dtype)
+            for index_no in quantities[0]:
+                extract_data_from_surf(record, index_no, self.__cache_lines, tor, 
+                                       direction, 
+                                       out=self.__slot(outputs[index_no], surfs[0]))
+            del record
+
+        files = [self.surface_files[i] for i in surfs[1:]]
+        args = (self.__cache_lines, tor, direction, self.cache_dir)
+        slots = [[self.__slot(outputs[index_no], i) for index_no in index_nos] 
+                 for i, index_nos in zip(surfs[1:], quantities[1:])]
+        if workers is not None and workers > 1 and len(files) > 1:
+            if pool == 'process':
+                with ProcessPoolExecutor(max_workers=workers, 
+                                         initializer=disable_shared_cache) as executor:
+                    results = executor.map(read_surface_file, files, 
+                                           quantities[1:], 
+                                           *[repeat(arg) for arg in args])
+                    for out, new in zip(slots, results):
+                        for slot, data in zip(out, new):
+                            slot[...] = data
+            elif pool == 'thread':
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    #list() reraises the errors of the workers
+                    list(executor.map(read_surface_file, files, quantities[1:], 
+                                      *[repeat(arg) for arg in args], slots))
+            else:
+                raise ValueError('pool should be "process" or "thread".')
         else:
-            gradB = None
-        
+            for index_nos, file, out in zip(quantities[1:], files, slots):
+                read_surface_file(file, index_nos, *args, out)
+
+        self.__data.update(outputs)
+
+    def __allocate_outputs(self, index_nos, tor, dtype):
+        """
+        Returns the arrays the quantities in 'index_nos' are read into: the 
+        loaded array if there is one, otherwise a new one.
+        """
+        outputs = {}
+        shape = (3, len(self.__cache_lines), len(tor))
         if len(self.surface_files) > 1:
-            field_lines = field_lines[..., np.newaxis]
-            if get_B:
-                B = B[..., np.newaxis]
-            if get_gradB:
-                gradB = gradB[..., np.newaxis]
+            shape += (len(self.surface_files),)
+        for index_no in index_nos:
+            outputs[index_no] = self.__data[index_no]
+            if outputs[index_no] is None:
+                with stage('allocate') as measured:
+                    outputs[index_no] = np.empty(shape, dtype=dtype)
+                    measured.record(bytes_allocated=outputs[index_no].nbytes)
+        return outputs
+
+    def __slot(self, output, surf):
+        """
+        Returns the view of 'output' holding the data of surface 'surf'.
+        """
+        if len(self.surface_files) > 1:
+            return output[..., surf]
+        return output
+
+    def iter_surfaces(self, getB=False, getGradB=False, prefetch=2, 
+                      workers=None, pool='thread', dtype=None):
+        """
+        Iterates over the selected surfaces without loading them all. Yields 
+        (surface number, field lines, B, gradB) for each surface, the data 
+        of shape (3, lines, toroidal bins) in the current selection, B and 
+        gradB None unless requested. The data is neither kept by the handler 
+        nor put in shared_cache, only the shape of the surface files and the 
+        default selection of lines and toroidal bins are set, as by 
+        load_data().
+
+        While the caller processes a surface, the next 'prefetch' ones are 
+        read in the background by a pool of 'workers' (1 by default) of kind 
+        'pool' ('thread' or 'process'). At most 'prefetch' surfaces are read 
+        ahead of the current one, so about prefetch + 1 surfaces are in 
+        memory at once. With prefetch=0 surfaces are read one by one when 
+        they are needed. Pending reads are cancelled if the iteration is 
+        stopped early.
+        """
+        if not self.surface_files:
+            return
+        index_nos, first, items, read = self.__surface_reader(getB, getGradB)
+        dtype = self.dtype if dtype is None else np.dtype(dtype)
+
+        def result(surface, data):
+            return surface_result(surface, index_nos, data, dtype)
+
+        if prefetch < 1:
+            if first is not None:
+                yield result(*first)
+            for surface, file in items:
+                yield result(surface, read(file))
+            return
+        if pool == 'process':
+            executor = ProcessPoolExecutor(max_workers=workers or 1, 
+                                           initializer=disable_shared_cache)
+        elif pool == 'thread':
+            executor = ThreadPoolExecutor(max_workers=workers or 1)
         else:
-            return field_lines, B, gradB
-
-        for file in self.surface_files[index+1:]:
-            surf = readsav(file)
-
-            new = self.__extract_data_from_surf(surf, 4)
-            field_lines = np.concatenate((field_lines, 
-                                          new[..., np.newaxis]), 
-                                          axis=-1)
-            if get_B:
-                new = self.__extract_data_from_surf(surf, 10)
-                B = np.concatenate((B, new[..., np.newaxis]), axis=-1)
-            if get_gradB:
-                new = self.__extract_data_from_surf(surf, 16)
-                gradB = np.concatenate((gradB, new[..., np.newaxis]), axis=-1)
-
-        return field_lines, B, gradB
-
-    def __extract_data_from_surf(self, surf, index_no):
-        """
-        Returns requested data from a flux surface file. Acts as part of the 
-        constructor, not used by itself. Takes the surface number and the 
-        processed selections as input.
-        Raises "NoSurfaceFileError" if file not found.
-        """
-        data = []
-        if self.direction == 'forward':
-            #reads forward calculated field lines
-            data = np.array([surf['surface'][0][index_no][self.lines], 
-                             surf['surface'][0][index_no + 1][self.lines], 
-                             surf['surface'][0][index_no + 2][self.lines]])
-        elif self.direction == 'backward':
-            #reads backward calculated field lines
-            data = np.array([surf['surface'][0][index_no + 3][self.lines], 
-                             surf['surface'][0][index_no + 4][self.lines], 
-                             surf['surface'][0][index_no + 5][self.lines]])
-        elif self.direction == 'both':
-            #reads both. backward lines are erversed and placed in front of 
-            #forward lines
-            data = np.array([surf['surface'][0][index_no][self.lines], 
-                             surf['surface'][0][index_no + 1][self.lines], 
-                             surf['surface'][0][index_no + 2][self.lines]])
-            data = np.concatenate((np.array([surf['surface'][0][index_no + 3][self.lines, -1::-1], 
-                                             surf['surface'][0][index_no + 4][self.lines, -1::-1], 
-                                             surf['surface'][0][index_no + 5][self.lines, -1::-1]]), 
-                                             data), axis=2)
-        return data[:, :, self.tor_range]
-
-    def return_field_lines(self):
-        """
-        Returnes stored data
-        """
-        return self.__field_lines
+            raise ValueError('pool should be "process" or "thread".')
+        #reads ahead of the current surface, at most 'prefetch'
+        pending = deque()
+        def submit():
+            for surface, file in islice(items, 1):
+                pending.append((surface, executor.submit(read, file)))
+        try:
+            for i in range(prefetch):
+                submit()
+            if first is not None:
+                yield result(*first)
+                first = None
+            while pending:
+                surface, future = pending.popleft()
+                submit()
+                yield result(surface, future.result())
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    async def iter_surfaces_async(self, getB=False, getGradB=False, prefetch=2, 
+                                  executor=None, dtype=None):
+        """
+        Asynchronous version of iter_surfaces(), to be used with 'async for'. 
+        Files, including the first one opened to learn the shape, are read in 
+        'executor' (the default executor of the event loop if None), at most 
+        'prefetch' surfaces ahead of the current one. 
+        Pending reads are cancelled if the iteration stops early.
+        """
+        if not self.surface_files:
+            return
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        index_nos, first, items, read = await loop.run_in_executor(
+            executor, self.__surface_reader, getB, getGradB)
+        dtype = self.dtype if dtype is None else np.dtype(dtype)
+        pending = deque()
+        def submit():
+            for surface, file in islice(items, 1):
+                pending.append((surface, loop.run_in_executor(executor, read, 
+                                                              file)))
+        try:
+            for i in range(prefetch):
+                submit()
+            if first is not None:
+                yield surface_result(first[0], index_nos, first[1], dtype)
+            while True:
+                if not pending:
+                    #nothing is read ahead with prefetch=0
+                    submit()
+                if not pending:
+                    break
+                surface, future = pending.popleft()
+                if prefetch > 0:
+                    submit()
+                yield surface_result(surface, index_nos, await future, dtype)
+        finally:
+            for surface, future in pending:
+                future.cancel()
+
+    def __surface_reader(self, getB, getGradB):
+        """
+        Prepares reading the selected surfaces one by one. Returns the record 
+        fields to read, the (surface, data) of the first surface if it had 
+        to be read to learn the shape of the data (None otherwise), an 
+        iterator of the (surface, file) pairs left and a function reading a 
+        file, read_surface_file() with the selection bound. Surfaces read 
+        one by one are not stored in shared_cache.
+        """
+        index_nos = [4] + [10] * getB + [16] * getGradB
+        items = zip(list(self.surfaces), list(self.surface_files))
+        first = None
+        if self.__shape is None:
+            #the first file tells the shape, its record is used for its data
+            surface, file = next(items)
+            record = open_surface_quantities(file, index_nos, self.direction, 
+                                             self.cache_dir, use_cache=False)
+            data = record[surface_fields(index_nos[:1], self.direction)[0]]
+            self.__shape = data.shape
+            self.__file_dtype = data.dtype.newbyteorder('=')
+            del data
+            self.__set_default_selection()
+            first = (surface, [extract_data_from_surf(record, index_no, 
+                                                      self.lines, self.tor_range, 
+                                                      self.direction) 
+                               for index_no in index_nos])
+            del record
+        self.__set_default_selection()
+        read = partial(read_surface_file, index_nos=index_nos, lines=self.lines, 
+                       tor_range=self.tor_range, direction=self.direction, 
+                       cache_dir=self.cache_dir, use_cache=False)
+        return index_nos, first, items, read
+
+    def return_field_lines(self, lazy=False):
+        """
+        Returnes stored data. If 'lazy' is True, a LazyFieldLines view of the 
+        current selection is returned instead, which reads the data from the 
+        surface files only when it is indexed.
+        """
+        if lazy:
+            return self.__lazy_view(4)
+        return self.__view(4)
                 
-    def return_B(self):
+    def return_B(self, lazy=False):
         """
-        Returnes stored data
+        Returnes stored data. See return_field_lines() for 'lazy'.
         """
-        return self.__B
+        if lazy:
+            return self.__lazy_view(10)
+        return self.__view(10)
 
-    def return_gradB(self):
+    def return_gradB(self, lazy=False):
         """
-        Returnes stored data
+        Returnes stored data. See return_field_lines() for 'lazy'.
         """
-        return self.__gradB
+        if lazy:
+            return self.__lazy_view(16)
+        return self.__view(16)
+
+    def __view(self, index_no):
+        """
+        Returns the loaded data of a quantity in the current selection of 
+        lines, toroidal bins and direction, or None if it is not loaded for 
+        all of it or the selection is out of range. The data is indexed only 
+        if the selection differs from what is loaded, and the result is kept 
+        until the next change.
+        """
+        data = self.__data[index_no]
+        if (index_no not in self.__requested or data is None or 
+                not all(self.__loaded[index_no])):
+            return None
+        if index_no not in self.__views:
+            self.__set_default_selection()
+            try:
+                lines = normalize_indices(self.lines, self.__shape[0])
+                tor = tor_to_cache(self.tor_range, self.direction, self.__shape[1])
+            except IndexError:
+                #load_data() raises the error
+                return None
+            lines = selection_positions(self.__cache_lines, lines)
+            tor = selection_positions(self.__cache_tor, tor)
+            if lines is None or tor is None:
+                return None
+            if not (np.array_equal(lines, np.arange(len(self.__cache_lines))) and 
+                    np.array_equal(tor, np.arange(len(self.__cache_tor)))):
+                data = data[:, lines[:, np.newaxis], tor]
+            self.__views[index_no] = data
+        return self.__views[index_no]
+
+    def __lazy_view(self, index_no):
+        """
+        Creates a LazyFieldLines of the quantity starting at record field 
+        'index_no'. If the shape and the type of the data in the files are not 
+        known from an earlier read, the first surface file is opened to find 
+        them.
+        """
+        if self.__shape is None or self.__file_dtype is None:
+            fields = surface_fields([index_no], self.direction)
+            record = open_surface_quantities(self.surface_files[0], [index_no], 
+                                             self.direction, self.cache_dir, 
+                                             use_cache=False)
+            self.__shape = record[fields[0]].shape
+            self.__file_dtype = record[fields[0]].dtype.newbyteorder('=')
+            del record
+        self.__set_default_selection()
+        dtype = self.__file_dtype if self.dtype is None else self.dtype
+        return LazyFieldLines(self.surface_files, index_no, self.lines, 
+                              self.tor_range, self.direction, self.cache_dir, 
+                              dtype)
 
     def return_fs_info(self):
         """
-        Returnes stored data
+        Returnes the FluxSurfaceInfo of the configuration. It is shared by 
+        handlers of the same fs_info file and can be indexed like a dict.
         """
         return self.__fs_info
 
+    def return_selection(self):
+        """
+        Returns the direction, lines and toroidal range as selected, with None 
+        for lines and toroidal range not given, which default to all. Unlike 
+        the attributes, it needs no surface file to be opened.
+        """
+        lines = None if self.lines is self.__default_lines else self.lines
+        tor_range = None if self.tor_range is self.__default_tor else self.tor_range
+        return self.direction, lines, tor_range
+
     def return_surface_files(self):
         return self.surface_files
 
     def return_surfaces(self):
         return self.surfaces
 
+class LazyFieldLines:
+    """
+    Array-like view of field lines (or B, gradB) of a selection of surface 
+    files. It has the same shape as the array FieldLineHandler.load_data() 
+    would create, but data is read from the surface files only when the view 
+    is indexed, and only for the requested surfaces, lines and toroidal bins. 
+    It is best used with the .npy surface cache, which is memory-mapped. 
+    Uncached .sav files have to be decoded on every access, and are not 
+    kept in shared_cache, so memory is proportional to what is indexed.
+
+    Each axis can be indexed by an int, a slice or a 1D array of ints or 
+    bools. Arrays are applied to each axis independently (orthogonal 
+    indexing), unlike NumPy's broadcasting of multiple index arrays. 
+    np.asarray() reads the whole selection.
+    """
+    def __init__(self, files, index_no, lines, tor_range, direction, 
+                 cache_dir=None, dtype=np.float64):
+        self.files = list(files)
+        self.index_no = index_no
+        self.lines = np.asarray(lines)
+        self.tor_range = np.asarray(tor_range)
+        self.direction = direction
+        self.cache_dir = cache_dir
+        self.dtype = np.dtype(dtype)
+        self.shape = (3, len(self.lines), len(self.tor_range))
+        if len(self.files) > 1:
+            self.shape += (len(self.files),)
+        self.ndim = len(self.shape)
+        #memory-mapped cache files are kept open, decoded .sav files are not
+        self.__records = {}
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[...]
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        ellipsis = [i for i, k in enumerate(key) if k is Ellipsis]
+        if ellipsis:
+            i = ellipsis[0]
+            key = key[:i] + (slice(None),) * (self.ndim - len(key) + 1) + key[i+1:]
+        if len(key) > self.ndim:
+            raise IndexError('Too many indices for LazyFieldLines.')
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        #indices along each axis, single ints are removed at the end
+        selection = [np.arange(n)[k] for n, k in zip(self.shape, key)]
+        scalar = tuple(0 if np.ndim(s) == 0 else slice(None) for s in selection)
+        selection = [np.atleast_1d(s) for s in selection]
+        if self.ndim == 3:
+            selection.append(np.zeros(1, dtype=int))
+        coords, lines, tor, surfs = selection
+
+        data = np.empty((len(coords), len(lines), len(tor), len(surfs)), 
+                        dtype=self.dtype)
+        for i, surf in enumerate(surfs):
+            new = extract_data_from_surf(self.__record(surf), self.index_no, 
+                                         self.lines[lines], self.tor_range[tor], 
+                                         self.direction)
+            data[..., i] = new[coords]
+        if self.ndim == 3:
+            data = data[..., 0]
+        return data[scalar]
+
+    def __record(self, surf):
+        if surf in self.__records:
+            return self.__records[surf]
+        record = open_surface_quantities(self.files[surf], [self.index_no], 
+                                         self.direction, self.cache_dir, 
+                                         use_cache=False)
+        if isinstance(record, CachedSurface):
+            self.__records[surf] = record
+        return record
+
+async def load_all_async(handlers, getB=False, getGradB=False, dtype=None, 
+                         progress=None, executor=None):
+    """
+    Loads the data of several handlers, e.g. of different configurations, 
+    at once with load_data_async(). 'progress' is called with the handler 
+    and the arguments of the progress of load_data_async(). Cancelling it 
+    cancels every load.
+    """
+    import asyncio
+
+    await asyncio.gather(*[handler.load_data_async(
+        getB, getGradB, dtype, 
+        None if progress is None else partial(progress, handler), executor) 
+        for handler in handlers])
+
+def disable_shared_cache():
+    """
+    Initializer of worker processes. Surfaces they decode are sent to the 
+    parent, so keeping them in their own shared_cache would only use memory.
+    """
+    shared_cache.set_budget(0)
+
+def surface_result(surface, index_nos, data, dtype=None):
+    """
+    Returns (surface, field lines, B, gradB) from the data of the record 
+    fields 'index_nos' read from a surface, None for those not read.
+    """
+    if dtype is not None:
+        data = [quantity.astype(dtype, copy=False) for quantity in data]
+    out = dict(zip(index_nos, data))
+    return surface, out[4], out.get(10), out.get(16)
+
+def read_surface_file(file, index_nos, lines, tor_range, direction, 
+                      cache_dir=None, out=None, use_cache=True):
+    """
+    Reads one surface file and returns a list with the data of each quantity 
+    whose first record field is given in 'index_nos'. If 'out' is given, the 
+    quantities are written into its arrays instead. The cache file is used 
+    if it is up to date, shared_cache only if 'use_cache' is True. Defined on 
+    module level, so it can be sent to worker processes.
+    """
+    with stage('read_surface', file=file):
+        record = open_surface_quantities(file, index_nos, direction, cache_dir, 
+                                         use_cache)
+        if out is None:
+            out = [None for index_no in index_nos]
+        return [extract_data_from_surf(record, index_no, lines, tor_range, 
+                                       direction, out=data) 
+                for index_no, data in zip(index_nos, out)]
+
+def open_surface_quantities(file, index_nos, direction, cache_dir=None, 
+                            use_cache=True):
+    """
+    Returns a record with the fields of the quantities in 'index_nos' in the 
+    given direction. A valid cache file is memory-mapped. Otherwise each 
+    quantity is looked up in shared_cache by (file, mtime, quantity, 
+    direction), falling back to data of both directions, and the missing ones 
+    are decoded together and stored in it. Worker processes of the handler 
+    run with no cache budget, as their copy of shared_cache is discarded with 
+    the pool. With use_cache=False shared_cache is bypassed, the fields are decoded 
+    and only referenced by the returned record.
+    """
+    if is_cache_valid(file, cache_file_name(file, cache_dir)):
+        return open_surface_file(file, cache_dir)
+    if not use_cache:
+        #the reader records the bytes it reads to the stage
+        with stage('decode', file=file):
+            record = decode_surface_file(file, surface_fields(index_nos, direction))
+        return record
+    file = os.path.abspath(file)
+    mtime = os.stat(file).st_mtime_ns
+    record = {}
+    missing = []
+    for index_no in index_nos:
+        key = (file, mtime, index_no, direction)
+        if key not in shared_cache and (file, mtime, index_no, 'both') in shared_cache:
+            key = (file, mtime, index_no, 'both')
+        fields = shared_cache.get(key)
+        if fields is None:
+            missing.append(index_no)
+        else:
+            record.update(fields)
+    if missing:
+        with stage('decode', file=file):
+            decoded = decode_surface_file(file, surface_fields(missing, direction))
+        for index_no in missing:
+            fields = {field: decoded[field] 
+                      for field in surface_fields([index_no], direction)}
+            shared_cache.put((file, mtime, index_no, direction), fields)
+            record.update(fields)
+    return record
+
+def surface_fields(index_nos, direction):
+    """
+    Returns the record fields needed to extract the quantities whose first 
+    field is given in 'index_nos' in the given direction.
+    """
+    if direction == 'forward':
+        offsets = range(3)
+    elif direction == 'backward':
+        offsets = range(3, 6)
+    else:
+        offsets = range(6)
+    return [index_no + offset for index_no in index_nos for offset in offsets]
+
+def tor_to_cache(tor_range, direction, tor_count):
+    """
+    Converts a toroidal selection in the given direction to indices of the 
+    toroidal axis of 'both' directions, where backward bins come first in 
+    reversed order and forward bins follow. These identify bins 
+    independently of the direction they were selected in. IndexError is 
+    raised if the selection is out of range in its direction.
+    """
+    if direction == 'forward':
+        return tor_count + normalize_indices(tor_range, tor_count)
+    elif direction == 'backward':
+        return tor_count - 1 - normalize_indices(tor_range, tor_count)
+    return normalize_indices(tor_range, 2 * tor_count)
+
+def cache_to_tor(tor, tor_count):
+    """
+    Inverse of tor_to_cache(). Returns the direction to read and the 
+    toroidal selection in it, preferring a single direction if all bins 
+    are in it.
+    """
+    if tor.min() >= tor_count:
+        return 'forward', tor - tor_count
+    elif tor.max() < tor_count:
+        return 'backward', tor_count - 1 - tor
+    return 'both', tor
+
+def selection_positions(keys, selection):
+    """
+    Returns the positions of the elements of 'selection' in 'keys', or None 
+    if any of them is missing.
+    """
+    order = np.argsort(keys, kind='stable')
+    positions = np.searchsorted(keys[order], selection)
+    positions[positions >= len(keys)] = 0
+    positions = order[positions]
+    if not np.array_equal(keys[positions], selection):
+        return None
+    return positions
+
+def selection_union(keys, selection):
+    """
+    Appends the elements of 'selection' that are not in 'keys' to 'keys'.
+    """
+    _, first = np.unique(selection, return_index=True)
+    new = selection[np.sort(first)]
+    return np.concatenate((keys, new[~np.isin(new, keys)]))
+
+def extract_data_from_surf(record, index_no, lines, tor_range, direction, 
+                           out=None):
+    """
+    Returns requested data from the 'surface' record of a flux surface file, 
+    either decoded by readsav or memory-mapped from the cache. 'index_no' is 
+    the record field of the x coordinate of the quantity: 4 for field lines, 
+    10 for the magnetic field and 16 for its gradient. The forward calculated 
+    y and z follow it, then the backward x, y, z. With direction 'both', 
+    backward lines are reversed and placed in front of forward lines.
+
+    The data is copied once, into 'out' if it is given, otherwise into a new 
+    array of shape (3, lines, tor_range). Evenly spaced selections are 
+    read as slices of the record arrays.
+    """
+    #records may hold only the fields of the direction
+    first = record[index_no + 3 if direction == 'backward' else index_no]
+    line_count, tor_count = np.shape(first)
+    lines = normalize_indices(lines, line_count)
+    tor = normalize_indices(tor_range, 
+                            2 * tor_count if direction == 'both' else tor_count)
+    with stage('extract', index_no=index_no) as measured:
+        if out is None:
+            out = np.empty((3, len(lines), len(tor)), 
+                           dtype=first.dtype.newbyteorder('='))
+            measured.record(bytes_allocated=out.nbytes)
+        if isinstance(record, CachedSurface):
+            #memory-mapped data is read by the copy, as much as is selected
+            measured.record(bytes_read=3 * len(lines) * len(tor) * 
+                                       first.dtype.itemsize)
+        copy_parts(record, index_no, lines, tor, tor_count, direction, out)
+    return out
+
+def copy_parts(record, index_no, lines, tor, tor_count, direction, out):
+    """
+    Copies the selected lines and bins of a quantity from a record into 
+    'out', in one or two parts by direction.
+    """
+    if direction == 'forward':
+        parts = [(0, slice(None), tor)]
+    elif direction == 'backward':
+        parts = [(3, slice(None), tor)]
+    else:
+        #indices of 'both' below tor_count are reversed backward bins
+        backward = tor < tor_count
+        parts = [(3, backward, tor_count - 1 - tor[backward]), 
+                 (0, ~backward, tor[~backward] - tor_count)]
+    for offset, positions, bins in parts:
+        if not isinstance(positions, slice):
+            if not positions.any():
+                continue
+            elif positions.all():
+                positions = slice(None)
+            else:
+                positions = as_slice(np.flatnonzero(positions))
+        for i in range(3):
+            src = record[index_no + offset + i]
+            if positions is None:
+                #the selection interleaves the directions
+                selected = np.flatnonzero(backward if offset else ~backward)
+                out[i][:, selected] = src[lines[:, np.newaxis], bins]
+            else:
+                copy_selection(src, lines, bins, out[i][:, positions])
+    return out
+
+def normalize_indices(indices, length):
+    """
+    Converts a selection of indices to an array of non-negative ints, 
+    raising IndexError if any is out of range.
+    """
+    indices = np.asarray(indices, dtype=np.intp).reshape(-1)
+    if len(indices) and (indices.min() < -length or indices.max() >= length):
+        raise IndexError(f'Index out of range for axis of length {length}.')
+    return indices % length if length else indices
+
+def as_slice(indices):
+    """
+    Returns a slice selecting the same elements as an array of non-negative 
+    indices, or None if they are not evenly spaced.
+    """
+    if len(indices) == 0:
+        return slice(0, 0)
+    if len(indices) == 1:
+        return slice(indices[0], indices[0] + 1)
+    step = indices[1] - indices[0]
+    if step == 0 or np.any(np.diff(indices) != step):
+        return None
+    stop = indices[-1] + step
+    return slice(indices[0], stop if stop >= 0 else None, step)
+
+def copy_selection(src, lines, bins, dest):
+    """
+    Copies src[lines][:, bins] into 'dest' without intermediate copies. Index 
+    arrays are turned into slices if possible, otherwise rows are taken one 
+    by one.
+    """
+    line_slice = as_slice(lines)
+    bin_slice = as_slice(bins)
+    if line_slice is not None and bin_slice is not None:
+        dest[...] = src[line_slice, bin_slice]
+    elif bin_slice is not None:
+        for row, line in zip(dest, lines):
+            row[...] = src[line, bin_slice]
+    else:
+        rows = src if line_slice is None else src[line_slice]
+        lines = lines if line_slice is None else range(len(lines))
+        for row, line in zip(dest, lines):
+            np.take(rows[line], bins, out=row, mode='wrap')
+
 def iter_2_array(selected):
     #if selection is iterable, put all elements into a list
     a = []
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+
+Data of the flux surfaces of a magnetic configuration from its fs_info.sav
+file: iota and effective radius of each surface, the separatrix surfaces of
+the main plasma and the islands, their names, and the island each surface
+belongs to.
+
+fs_info files are read once per path and modification time by
+read_fs_info(), and the same immutable FluxSurfaceInfo is shared by every
+handler of the configuration.
+"""
+
+import os
+import threading
+import numpy as np
+
+from .errors import SavFormatError
+from .sav_reader import read_struct_fields, readsav
+
+#record fields of iota, reff, separatrix, names and flags in fs_info
+FIELDS = {'iota': 3, 'reff': 4, 'separatrix': 6, 'names': 7, 'flags': 8}
+
+class FluxSurfaceInfo:
+    """
+    Read-only flux surface data, indexed by surface number. Entries can be
+    read as attributes or by name like a dict, e.g. info['reff']. Besides
+    the raw data, island membership masks and orderings by reff and iota
+    are precomputed, so selections by radius or iota are binary searches.
+
+    Island 0 is the main plasma, island i has the separatrix surface
+    separatrix[i] and the surfaces whose flag is i.
+    """
+    def __init__(self, iota, reff, separatrix, names, flags):
+        def frozen(data, dtype=None):
+            data = np.array(data, dtype=dtype)
+            data.flags.writeable = False
+            return data
+        names = [bytes(name) for name in np.atleast_1d(names)]
+        names[0] = b'main plasma'
+        data = {'iota': frozen(iota, np.float64),
+                'reff': frozen(reff, np.float64),
+                'separatrix': frozen(np.atleast_1d(separatrix), np.intp),
+                'names': frozen(names, np.object_),
+                'flags': frozen(flags, np.intp)}
+        data['island_masks'] = frozen(data['flags'] ==
+                                      np.arange(len(names))[:, np.newaxis])
+        data['reff_order'] = frozen(np.argsort(data['reff'], kind='stable'))
+        data['iota_order'] = frozen(np.argsort(data['iota'], kind='stable'))
+        #orderings of each island
+        data['island_reff_order'] = tuple(
+            frozen(data['reff_order'][mask[data['reff_order']]])
+            for mask in data['island_masks'])
+        data['island_iota_order'] = tuple(
+            frozen(data['iota_order'][mask[data['iota_order']]])
+            for mask in data['island_masks'])
+        object.__setattr__(self, '_FluxSurfaceInfo__data', data)
+
+    def __getattr__(self, name):
+        try:
+            return self.__data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError('FluxSurfaceInfo is read-only.')
+
+    def __getitem__(self, name):
+        return self.__data[name]
+
+    def __contains__(self, name):
+        return name in self.__data
+
+    def __len__(self):
+        return len(self.__data['iota'])
+
+    def keys(self):
+        return FIELDS.keys()
+
+    def island(self, island):
+        """
+        Returns the index of an island given by index or name.
+        """
+        if isinstance(island, (str, bytes)):
+            name = island.encode() if isinstance(island, str) else island
+            names = list(self.names)
+            if name not in names:
+                raise ValueError(f'No island named {island!r}.')
+            return names.index(name)
+        return int(island)
+
+    def island_mask(self, island=0):
+        """
+        Boolean mask of the surfaces of an island.
+        """
+        return self.island_masks[self.island(island)]
+
+    def sorted_surfaces(self, island=None):
+        """
+        Surface numbers sorted by reff, of all surfaces or of an island.
+        """
+        if island is None:
+            return self.reff_order
+        return self.island_reff_order[self.island(island)]
+
+    def surfaces_within(self, reff, island=None):
+        """
+        Surface numbers sorted by reff with reff not larger than 'reff', of
+        all surfaces or of an island.
+        """
+        order = self.sorted_surfaces(island)
+        return order[:np.searchsorted(self.reff[order], reff, side='right')]
+
+    def inside_separatrix(self, island=0):
+        """
+        Surface numbers of an island inside its separatrix, including the
+        separatrix itself, sorted by reff.
+        """
+        island = self.island(island)
+        return self.surfaces_within(self.reff[self.separatrix[island]], island)
+
+    def iota_surface(self, iota, island=0):
+        """
+        Returns the surface number of an island with iota closest to 'iota'.
+        """
+        order = self.island_iota_order[self.island(island)]
+        if not len(order):
+            raise ValueError('The island has no surfaces.')
+        i = np.searchsorted(self.iota[order], iota)
+        candidates = order[max(i - 1, 0):i + 1]
+        return int(candidates[np.argmin(np.abs(self.iota[candidates] - iota))])
+
+    def iota_range(self, low, high, island=None):
+        """
+        Surface numbers with iota in [low, high], sorted by iota.
+        """
+        order = self.iota_order if island is None else \
+                self.island_iota_order[self.island(island)]
+        values = self.iota[order]
+        return order[np.searchsorted(values, low, side='left'):
+                     np.searchsorted(values, high, side='right')]
+
+#read fs_info files by (path, modification time)
+fs_info_cache = {}
+fs_info_lock = threading.Lock()
+
+def read_fs_info(file):
+    """
+    Returns the FluxSurfaceInfo of an fs_info.sav file. It is read only if
+    it was not read before or was modified since.
+    """
+    path = os.path.abspath(file)
+    key = (path, os.stat(path).st_mtime_ns)
+    with fs_info_lock:
+        info = fs_info_cache.get(key)
+    if info is None:
+        info = decode_fs_info(path)
+        with fs_info_lock:
+            for old in [old for old in fs_info_cache if old[0] == path]:
+                del fs_info_cache[old]
+            info = fs_info_cache.setdefault(key, info)
+    return info
+
+def decode_fs_info(file):
+    """
+    Reads the needed fields of an fs_info.sav file, by sav_reader if it
+    supports the file and by readsav otherwise.
+    """
+    try:
+        record = read_struct_fields(file, 'fs_info', FIELDS.values())
+    except SavFormatError:
+        record = readsav(file)['fs_info'][0]
+    return FluxSurfaceInfo(**{name: record[i] for name, i in FIELDS.items()})
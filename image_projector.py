@@ -11,13 +11,14 @@ to image coordinates for various fast cameras used in fusion devices.
 
 from operator import ne
 import os
+import re
 import numpy as np
 
-import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
+from .instrumentation import stage
+from .sav_reader import readsav
 
-from scipy import ndimage
-from scipy.io import readsav
+#file of precalibrated view parameters
+VIEWS_FILE = os.path.join(os.path.dirname(__file__), 'views2.txt')
 
 class ImageProjector:
     """
@@ -93,52 +94,13 @@ class ImageProjector:
                   shot, 
                   cam, 
                   transpose=False, 
-                  file=os.path.join(os.path.dirname(__file__), 'views2.txt')):
+                  file=VIEWS_FILE):
         """
         Alternate constructor that reads precalibrated parameters from 
-        a text file of specific format.
-        """
-        if "AE" in view.upper() and not "W7X-" in view.upper():
-            view = 'W7X-' + view.upper()
-
-        with open(file, 'r') as f:
-            line = f.readline()
-            is_view_valid = False
-            while line[:-1] != '!!!':
-                if line[:-1] == view:
-                    is_view_valid = True
-                line = f.readline()
-            
-            if not is_view_valid:
-                raise ValueError('No such view.\n')
-
-            while line[:-1] != view:
-                line = f.readline()
-
-            while line[:-1] != '!!!':
-                if line[:-1] == 'shot: ' + shot:
-                    line = f.readline()
-                    if line[:-1] == 'cam: ' + cam:
-                        line = f.readline()
-                        line = line[8:-2].split(',')
-                        R0 = float(line[0].split(':')[1])
-                        theta0 = float(line[2].split(':')[1])
-                        z0 = float(line[1].split(':')[1])
-                        Rp = float(line[3].split(':')[1])
-                        thetap = float(line[5].split(':')[1])
-                        zp = float(line[4].split(':')[1])
-                        enh = float(line[6].split(':')[1])
-                        alpha = float(line[7].split(':')[1])
-                        xoff = float(line[8].split(':')[1])
-                        yoff = float(line[9].split(':')[1])
-                        imsize = [int(line[13].split('[')[1]), int(line[14].split(']')[0])]
-                        new_view =  cls(R0, theta0, z0, Rp, thetap, zp, enh, alpha, xoff, yoff, view, shot, cam, imsize)
-                        if transpose:
-                            new_view.transpose()
-                        return new_view
-                line = f.readline()
-
-        raise ValueError('Parameters were not found.\n')     
+        a text file of specific format. The file is parsed once and kept by 
+        view_registry() until it is modified.
+        """
+        return view_registry(file).get(view, shot, cam, transpose)
 
     def __set_up_projection(self, enh, alpha, xoff, yoff, mirror=None):
         """
@@ -250,35 +212,455 @@ class ImageProjector:
         self.__offset = T @ self.__offset
         self.__projector_matrix = T @ self.__projector_matrix
 
-    def project_points(self, points):
+    def project_points(self, points, return_depth=False):
+        """
+        Projects point to image plane. Input is an array of shape (3, ...) 
+        where the columns are the projected points. If 'return_depth' is 
+        True, their distance from the camera along its line of view (see 
+        calc_depth()) is returned too.
+        """
+        x0 = self.__x0.reshape((3,) + (1,) * (np.ndim(points) - 1))
+        points = points - x0
+        along = np.tensordot(self.__norm, points, axes=(0,0))
+        t = (-self.__d - np.tensordot(self.__norm, x0, axes=(0,0))) / along
+        if return_depth:
+            return points * t + x0, -along
+        return points * t + x0
+
+    def projection_kernel(self):
         """
-        Projects point to image plane. Input is a 3xn matrix 
-        where the columns are the projected points.
+        Returns the parameters of the fused projection used by 
+        project_to_pixels(): a 3x3 matrix of the projection matrix and the 
+        normal of the image plane, the viewpoint in these coordinates, the 
+        scale of the projection and the pixel coordinates of the viewpoint.
         """
-        points = points - self.__x0
-        t = (-self.__d - np.tensordot(self.__norm, self.__x0, axes=(0,0))) / \
-            np.tensordot(self.__norm, points, axes=(0,0))
-        return points * t + self.__x0
+        x0 = self.__x0.reshape(3)
+        matrix = np.vstack((self.__projector_matrix, self.__norm))
+        scale = np.squeeze(-self.__d - self.__norm @ x0)
+        origin = self.__projector_matrix @ x0 + self.__offset.reshape(2)
+        return matrix, matrix @ x0, scale, origin
 
-    def calc_pixel_coord(self, points):
+    def calc_pixel_coord(self, points, out=None, dtype=None):
         """
-        Calculates pixel coordinates of input points. Input is a 3d 
-        column vector or a 3xn matrix where the columns are the 
-        projected points.
+        Calculates pixel coordinates of input points. Input is an array of 
+        shape (3, ...), e.g. a 3d column vector or a 3xn matrix where the 
+        columns are the projected points, the output has shape (2, ...). It 
+        is written into 'out' if that is given. The projector is not 
+        modified, so it can be used from several threads at once.
+
+        dtype: type of the calculation and the output, float64 by default. 
+            With np.float32, pixel coordinates of points in the image 
+            (1280x1024) differ from the float64 ones by less than 0.01 pixel, 
+            also for float32 input.
         """
-        if points.ndim == 4:
-            self.__x0 = self.__x0.reshape(3,1,1,1)
-            self.__offset = self.__offset.reshape(2,1,1,1)
-        elif points.ndim == 3:
-            self.__x0 = self.__x0.reshape(3,1,1)
-            self.__offset = self.__offset.reshape(2,1,1)
-        elif points.ndim == 2:
-            self.__x0 = self.__x0.reshape(3,1)
-            self.__offset = self.__offset.reshape(2,1)
-        else:
-            raise ValueError("Inappropriate number of input dimensions.")
-        points = self.project_points(points)
-        return np.tensordot(self.__projector_matrix, points, axes=(1,0)) + self.__offset
+        with stage('calc_pixel_coord', points=np.size(points) // 3) as measured:
+            result = project_to_pixels(points, *self.projection_kernel(), 
+                                       out=out, dtype=dtype)
+            if out is None:
+                measured.record(bytes_allocated=result.nbytes)
+        return result
+
+    def calc_depth(self, points):
+        """
+        Returns the distance of input points of shape (3, ...) from the 
+        camera along its line of view, shape (...). It is negative for points 
+        behind the camera.
+        """
+        x0 = self.__x0.reshape(3)
+        return self.__norm @ x0 - np.tensordot(self.__norm, points, axes=(0, 0))
+
+    def image_shape(self):
+        """
+        Returns the shape of per-pixel maps of the image: rows along the 
+        second pixel coordinate, columns along the first.
+        """
+        return self.__imsize[0], self.__imsize[1]
+
+    def image_bounds(self, margin=0):
+        """
+        Returns the lower and upper bounds of the pixel coordinates of the 
+        image along both output coordinates, extended by 'margin' pixels. As 
+        in update_projection(), the first coordinate runs along imsize[1], 
+        the second along imsize[0].
+        """
+        upper = np.array([self.__imsize[1], self.__imsize[0]]) - 0.5 + margin
+        return np.full(2, -0.5 - margin), upper
+
+    def cull(self, points, margin=0):
+        """
+        Returns a boolean array of shape points.shape[1:], True for points in 
+        front of the camera that fall within the image (extended by 'margin' 
+        pixels).
+        """
+        points = np.asarray(points)
+        visible = np.zeros(points.shape[1:], dtype=bool)
+        indices, _ = cull_to_pixels(points, *self.projection_kernel(), 
+                                    *self.image_bounds(margin))
+        visible.reshape(-1)[indices] = True
+        return visible
+
+    def visible_pixel_coord(self, points, margin=0, masked=False, dtype=None):
+        """
+        Calculates pixel coordinates of the input points of shape (3, ...) 
+        that are in front of the camera and fall within the image, extended 
+        by 'margin' pixels. Returns the pixel coordinates of the visible 
+        points as a (2, n) array and the tuple of their indices in 
+        points.shape[1:], as np.nonzero() would. If 'masked' is True, a 
+        masked array of shape (2, ...) is returned instead, where the other 
+        points are masked.
+        """
+        points = np.asarray(points)
+        indices, pixels = cull_to_pixels(points, *self.projection_kernel(), 
+                                         *self.image_bounds(margin), 
+                                         dtype=dtype)
+        if masked:
+            data = np.zeros((2, points[0].size), dtype=pixels.dtype)
+            mask = np.ones((2, points[0].size), dtype=bool)
+            data[:, indices] = pixels
+            mask[:, indices] = False
+            shape = (2,) + points.shape[1:]
+            return np.ma.masked_array(data.reshape(shape), mask.reshape(shape))
+        return pixels, np.unravel_index(indices, points.shape[1:])
+
+class MultiViewProjector:
+    """
+    Projects the same points to the images of several ImageProjectors at 
+    once. The projection parameters of the views are stacked, so each chunk 
+    of points is read once for all views. The output has shape 
+    (views, 2, ...) for an input of shape (3, ...), and memory besides it is 
+    bounded by 'chunk_size' points. By default chunks are smaller with more 
+    views, so that the buffer stays as small as that of a single view.
+    """
+    def __init__(self, projectors, chunk_size=None):
+        self.projectors = list(projectors)
+        if not self.projectors:
+            raise ValueError('No projectors are given.')
+        self.chunk_size = chunk_size or max(CHUNK_SIZE // len(self.projectors), 
+                                            1024)
+        kernels = [projector.projection_kernel() for projector in self.projectors]
+        self.__matrix = np.vstack([kernel[0] for kernel in kernels])
+        self.__x0 = np.concatenate([kernel[1] for kernel in kernels])
+        self.__scale = np.array([kernel[2] for kernel in kernels]).reshape(-1)
+        self.__origin = np.array([kernel[3] for kernel in kernels])
+
+    def __len__(self):
+        return len(self.projectors)
+
+    @classmethod
+    def from_file(cls, 
+                  selection, 
+                  transpose=False, 
+                  file=VIEWS_FILE, 
+                  chunk_size=None):
+        """
+        Creates the projectors of a list of (view, shot, cam) from the file 
+        of precalibrated parameters.
+        """
+        registry = view_registry(file)
+        return cls([registry.get(view, shot, cam, transpose) 
+                    for view, shot, cam in selection], chunk_size)
+
+    def calc_pixel_coord(self, points, out=None, dtype=None):
+        """
+        Calculates pixel coordinates of input points of shape (3, ...) in 
+        each view. Returns an array of shape (views, 2, ...), or writes it 
+        into 'out'. 'dtype' is the same as for ImageProjector.
+        """
+        with stage('multi_view_calc_pixel_coord', points=np.size(points) // 3, 
+                   views=len(self)) as measured:
+            result = project_to_pixels(points, self.__matrix, self.__x0, 
+                                       self.__scale, self.__origin, out, 
+                                       self.chunk_size, dtype)
+            if out is None:
+                measured.record(bytes_allocated=result.nbytes)
+        return result
+
+class ViewRegistry:
+    """
+    Precalibrated view parameters of a views file (by default views2.txt), 
+    parsed once. The file starts with the list of views, closed by '!!!'. 
+    Then each view has a section of shot, cam and struct lines, also closed 
+    by '!!!'. Use view_registry() to share registries between callers.
+    """
+    def __init__(self, file=VIEWS_FILE):
+        self.file = file
+        self.mtime_ns = os.stat(file).st_mtime_ns
+        self.__views, self.__parameters = parse_views_file(file)
+
+    def list_views(self):
+        return list(self.__views)
+
+    def list_shots(self, view):
+        """
+        Lists the calibration shots of a view.
+        """
+        view = self.__check_view(view)
+        return list(dict.fromkeys(shot for v, shot, cam in self.__parameters 
+                                  if v == view))
+
+    def list_cams(self, view, shot):
+        view = self.__check_view(view)
+        return [cam for v, s, cam in self.__parameters 
+                if v == view and s == shot]
+
+    def parameters(self, view, shot, cam):
+        """
+        Returns the ImageProjector arguments of a view, shot and cam.
+        """
+        view = self.__check_view(view)
+        if (view, shot, cam) not in self.__parameters:
+            raise ValueError('Parameters were not found.\n')
+        parameters = dict(self.__parameters[(view, shot, cam)])
+        parameters['imsize'] = list(parameters['imsize'])
+        return parameters
+
+    def get(self, view, shot, cam, transpose=False):
+        """
+        Creates the ImageProjector of a view, shot and cam.
+        """
+        view = normalize_view_name(view)
+        new_view = ImageProjector(**self.parameters(view, shot, cam), 
+                                  viewpoint=view, shot=shot, cam=cam)
+        if transpose:
+            new_view.transpose()
+        return new_view
+
+    def all_projectors(self, transpose=False):
+        """
+        Creates the ImageProjectors of every calibration in the file. Returns 
+        a dict keyed by (view, shot, cam).
+        """
+        return {key: self.get(*key, transpose) for key in self.__parameters 
+                if key[0] in self.__views}
+
+    def __check_view(self, view):
+        view = normalize_view_name(view)
+        if view not in self.__views:
+            raise ValueError('No such view.\n')
+        return view
+
+#registries of views files by absolute path
+view_registries = {}
+
+def view_registry(file=VIEWS_FILE):
+    """
+    Returns the ViewRegistry of a views file. It is parsed again only if it 
+    was modified since the last call.
+    """
+    path = os.path.abspath(file)
+    registry = view_registries.get(path)
+    if registry is None or registry.mtime_ns != os.stat(path).st_mtime_ns:
+        registry = ViewRegistry(path)
+        view_registries[path] = registry
+    return registry
+
+def normalize_view_name(view):
+    """
+    W7X port names can be given without the 'W7X-' prefix, in any case.
+    """
+    if "AE" in view.upper() and not "W7X-" in view.upper():
+        view = 'W7X-' + view.upper()
+    return view
+
+def parse_views_file(file):
+    """
+    Returns the list of views and a dict from (view, shot, cam) to 
+    ImageProjector arguments. If a calibration is repeated, the first one is 
+    kept.
+    """
+    with open(file, 'r') as f:
+        lines = [line.rstrip('\r\n') for line in f]
+    end = lines.index('!!!')
+    views = lines[:end]
+    parameters = {}
+    view = None
+    for i in range(end + 1, len(lines)):
+        if lines[i] == '!!!':
+            view = None
+        elif view is None:
+            view = lines[i]
+        elif (lines[i].startswith('shot: ') and i + 2 < len(lines) and 
+                lines[i + 1].startswith('cam: ') and 
+                lines[i + 2].startswith('struct=')):
+            key = (view, lines[i][6:], lines[i + 1][5:])
+            if key not in parameters:
+                parameters[key] = parse_struct(lines[i + 2])
+    return views, parameters
+
+#names of the struct fields of ImageProjector arguments
+STRUCT_FIELDS = {'R0': 'R0', 'theta0': 'theta0', 'z0': 'z0', 'Rp': 'Rp', 
+                 'thetap': 'thetap', 'zp': 'zp', 'l0': 'enh', 'gamma': 'alpha', 
+                 'xoffset': 'xoff', 'yoffset': 'yoff'}
+
+def parse_struct(line):
+    """
+    Parses a 'struct={name:value, ...}' line of a views file.
+    """
+    fields = dict(re.findall(r'(\w+)\s*:\s*(\[[^\]]*\]|[^,}]+)', 
+                             line[line.index('{') + 1:]))
+    parameters = {name: float(fields[field]) 
+                  for field, name in STRUCT_FIELDS.items()}
+    parameters['imsize'] = [int(v) for v in fields['imsize'].strip('[] ').split(',')]
+    return parameters
+
+#number of points projected at once by project_to_pixels
+CHUNK_SIZE = 1 << 16
+
+def project_to_pixels(points, matrix, x0, scale, origin, out=None, 
+                      chunk_size=CHUNK_SIZE, dtype=None):
+    """
+    Projects points of shape (3, ...) to pixel coordinates with the 
+    parameters given by ImageProjector.projection_kernel(). Pixel coordinates 
+    are origin + scale * u / w, where u and w are the first two and the 
+    third coordinate of matrix @ point - x0. Parameters of several views can 
+    be stacked: matrix (3 * views, 3), x0 (3 * views), scale (views) and 
+    origin (views, 2), then the output has shape (views, 2, ...). Points are 
+    processed in chunks, so apart from the output only a buffer of 
+    3 x views x chunk_size is allocated. NumPy releases the GIL in these 
+    operations, so threads can run in parallel. The calculation is done in 
+    'dtype' if it is given, otherwise in the type of the points and the 
+    parameters.
+    """
+    points = np.asarray(points)
+    if points.ndim < 1 or points.shape[0] != 3:
+        raise ValueError("Inappropriate number of input dimensions.")
+    if dtype is None:
+        dtype = np.result_type(points.dtype, matrix.dtype)
+    dtype = np.dtype(dtype)
+    matrix, x0, scale, origin = [np.asarray(value, dtype=dtype) 
+                                 for value in (matrix, x0, scale, origin)]
+    views = len(matrix) // 3
+    stacked = np.ndim(origin) > 1
+    shape = ((views,) if stacked else ()) + (2,) + points.shape[1:]
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape != shape:
+        raise ValueError(f'out should have shape {shape}.')
+    points = points.reshape(3, -1)
+    result = out.view()
+    try:
+        result.shape = (views, 2, -1)
+    except AttributeError:
+        #out can not be reshaped without a copy, use a temporary output
+        result = np.empty((views, 2, points.shape[1]), dtype=dtype)
+
+    scale = np.reshape(scale, (views, 1))
+    x0 = np.reshape(x0, (views, 3, 1))
+    origin = np.reshape(origin, (views, 2, 1))
+    buffer = np.empty(3 * views * min(chunk_size, points.shape[1]), 
+                      dtype=dtype)
+    for start in range(0, points.shape[1], chunk_size):
+        block = points[:, start:start + chunk_size].astype(dtype, copy=False)
+        uvw = buffer[:3 * views * block.shape[1]].reshape(3 * views, -1)
+        np.dot(matrix, block, out=uvw)
+        uvw = uvw.reshape(views, 3, -1)
+        uvw -= x0
+        np.divide(scale, uvw[:, 2], out=uvw[:, 2])
+        pixels = result[..., start:start + chunk_size]
+        np.multiply(uvw[:, :2], uvw[:, 2:], out=pixels, casting='unsafe')
+        pixels += origin
+
+    if not np.shares_memory(result, out):
+        out[...] = result.reshape(shape)
+    return out
+
+def cull_to_pixels(points, matrix, x0, scale, origin, lower, upper, 
+                   chunk_size=CHUNK_SIZE, dtype=None):
+    """
+    Projects the points of shape (3, ...) in chunks like project_to_pixels() 
+    and keeps only those in front of the camera, whose pixel coordinates are 
+    between 'lower' and 'upper'. Returns the flat indices of the visible 
+    points and their pixel coordinates as a (2, n) array. Points are in 
+    front of the camera if the third coordinate w of matrix @ point - x0 is 
+    negative, since the normal of the image plane points to the camera.
+    """
+    points = np.asarray(points)
+    if points.ndim < 1 or points.shape[0] != 3:
+        raise ValueError("Inappropriate number of input dimensions.")
+    if dtype is None:
+        dtype = np.result_type(points.dtype, matrix.dtype)
+    matrix = np.asarray(matrix, dtype=dtype)
+    scale = np.asarray(scale, dtype=dtype)
+    x0, origin, lower, upper = [np.asarray(value, dtype=dtype).reshape(-1, 1) 
+                                for value in (x0, origin, lower, upper)]
+    points = points.reshape(3, -1)
+    indices = []
+    pixels = []
+    for start in range(0, points.shape[1], chunk_size):
+        block = points[:, start:start + chunk_size].astype(dtype, copy=False)
+        uvw = matrix @ block
+        uvw -= x0
+        visible = uvw[2] < 0
+        uv = uvw[:2] * (scale / uvw[2]) + origin
+        visible &= ((uv >= lower) & (uv < upper)).all(axis=0)
+        chunk_indices = np.flatnonzero(visible)
+        indices.append(chunk_indices + start)
+        pixels.append(uv[:, chunk_indices])
+    if not indices:
+        return np.zeros(0, dtype=np.intp), np.zeros((2, 0), dtype=dtype)
+    return np.concatenate(indices), np.concatenate(pixels, axis=1)
+
+def iter_pixel_coord(projector, source, chunk=1, axis=None, dtype=None):
+    """
+    Projects 'source' chunk by chunk and yields (key, pixels), where 'key' 
+    indexes the chunk in the output of projecting the whole source at once. 
+    'projector' is an ImageProjector or a MultiViewProjector. 'source' is an 
+    array-like of shape (3, ...), e.g. a memory-mapped array or a 
+    LazyFieldLines, or a FieldLineHandler, whose lazy field lines are used. 
+    Chunks are 'chunk' long along 'axis', so only one chunk of the input and 
+    the output is in memory at a time. By default it is the line axis of 
+    arrays, whose chunks are contiguous in the (3, lines, tor, surfaces) 
+    layout of the handler, and the surface axis of 4d lazy field lines, 
+    which read the files surface by surface. 'dtype' is passed to 
+    calc_pixel_coord().
+    """
+    source = point_source(source)
+    ndim = len(source.shape)
+    if ndim < 2 or source.shape[0] != 3:
+        raise ValueError("Inappropriate number of input dimensions.")
+    if axis is None:
+        axis = 3 if ndim == 4 and not isinstance(source, np.ndarray) else 1
+    elif axis % ndim == 0:
+        raise ValueError('Chunks can not be taken along the coordinate axis.')
+    axis %= ndim
+    for start in range(0, source.shape[axis], chunk):
+        key = (slice(None),) * axis + (slice(start, start + chunk),)
+        pixels = projector.calc_pixel_coord(np.asarray(source[key]), dtype=dtype)
+        #the output of several views has an extra leading axis
+        yield (slice(None),) * (pixels.ndim - ndim) + key, pixels
+
+def project_stream(projector, source, out=None, sink=None, chunk=1, axis=None, 
+                   dtype=np.float64):
+    """
+    Projects 'source' chunk by chunk with iter_pixel_coord(), for inputs 
+    whose pixel coordinates do not fit in memory. Chunks are written to 
+    'out', which can be an array, e.g. a memory-mapped one, or the path of a 
+    .npy file that is created with the type 'dtype', which is also the type 
+    of the calculation. Each chunk is passed to 
+    sink(key, pixels) as well if 'sink' is given. Returns 'out', which is a 
+    memory-mapped array if a path was given.
+    """
+    source = point_source(source)
+    for key, pixels in iter_pixel_coord(projector, source, chunk, axis, dtype):
+        if isinstance(out, (str, os.PathLike)):
+            views = pixels.shape[:pixels.ndim - len(source.shape)]
+            out = np.lib.format.open_memmap(out, mode='w+', dtype=dtype, 
+                                            shape=views + (2,) + tuple(source.shape[1:]))
+        if out is not None:
+            out[key] = pixels
+        if sink is not None:
+            sink(key, pixels)
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
+
+def point_source(source):
+    """
+    Returns the lazy field lines of a FieldLineHandler, or 'source' itself.
+    """
+    if hasattr(source, 'return_field_lines'):
+        return source.return_field_lines(lazy=True)
+    return source
 
 def dir_vector(x1, x2):
     return (x1 - x2) / np.linalg.norm(x1 - x2)
@@ -290,7 +672,9 @@ def rzt_2_xyz(r, theta, z):
     return np.array([[r * np.cos(theta)], [r * np.sin(theta)], [z]])
 
 #The rest are helper function used for testing, developement and validation. 
-#They are not directly involved in the class' function.
+#They are not directly involved in the class' function. matplotlib and 
+#scipy.ndimage are imported by the functions using them, as importing them 
+#takes longer than the rest of the module.
 def plot_calib_img(img, y0=115, y1=1051, x0=492, x1=1661, rotate=None, mirror=None):
     """
     Plots calib images with highlighted reference points.
@@ -301,6 +685,10 @@ def plot_calib_img(img, y0=115, y1=1051, x0=492, x1=1661, rotate=None, mirror=No
     rotate: Number of 90° rotations.
     mirror: 1: mirror along vertical, 2: along horizontal axis.
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.image as mpimg
+    from scipy import ndimage
+
     img = mpimg.imread(img)
     img = img[y0:y1, x0:x1, :]
     plt.figure()
@@ -348,6 +736,8 @@ def plot_field_lines(surf, folder, color='k', direction='forward'):
     folder: Path to source files.
     color: Color of the plotted lines.
     """
+    import matplotlib.pyplot as plt
+
     line_f = get_field_lines(surf, folder, direction)
 
     plt.gca(projection='3d')
@@ -359,6 +749,8 @@ def plot_view(R0, theta0, z0, Rp, thetap, zp, color='r'):
     """
     Plot arrows along camera views.
     """
+    import matplotlib.pyplot as plt
+
     x0 = rzt_2_xyz(R0, theta0, z0)
     xp = rzt_2_xyz(Rp, thetap, zp)
     plt.quiver(x0[0],x0[1],x0[2], xp[0] - x0[0], xp[1] - x0[1], xp[2] - x0[2], arrow_length_ratio=0.05, color=color)
@@ -375,6 +767,8 @@ def plot_surface_2d(view, number, r, folder, color):
     """
     Plot projected cross-section of flux surface.
     """
+    import matplotlib.pyplot as plt
+
     surf = get_flux_surface(number, r, folder)
     surf = view.calc_pixel_coord(surf)
     plt.plot(surf[0,:], surf[1,:], color)
@@ -383,6 +777,8 @@ def plot_surface_3d(number, r, folder, color):
     """
     Plot radial cross-section of a selected flux surface in 3d.
     """
+    import matplotlib.pyplot as plt
+
     surf = get_flux_surface(number, r, folder)
     plt.plot(surf[0,:], surf[1,:], surf[2,:], color)
 
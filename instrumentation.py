@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+
+Opt-in timing and memory statistics of reading and projection. The stages
+of FieldLineHandler and ImageProjector (loading, reading and decoding each
+surface, extraction, allocation, projection) are measured only while
+instrumentation is on, and cost a single check otherwise.
+
+Turn it on for a block of code with the instrument() context manager,
+which collects the measurements into a Stats object:
+
+    with instrument(trace_memory=True) as stats:
+        handler.load_data()
+    print(stats)
+
+or register a callback, which gets a dict per measured call, to forward
+the numbers to a metrics system:
+
+    add_callback(send_to_metrics)
+
+Code below a stage reports what only it knows, like the bytes a reader
+actually consumed, with record(), which adds to the innermost stage being
+measured in the thread.
+
+Stages run by worker processes are not measured. Peak memory needs
+trace_memory=True, which runs tracemalloc and slows down allocations. The
+peak is process-wide, so stages running in parallel threads see each
+other's allocations.
+"""
+
+import threading
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+
+#active Stats objects and callbacks, measuring is on if any is set
+sinks = []
+sinks_lock = threading.Lock()
+#number of instrument() blocks tracing memory, and whether they started it
+memory_tracers = 0
+tracing_started = False
+local = threading.local()
+
+class Stats:
+    """
+    Measurements collected by instrument(). 'stages' holds the totals of
+    each stage: number of calls, time in seconds, bytes read and allocated,
+    and the highest peak memory in bytes above the start of a call (None
+    without memory tracing). 'events' holds the measurement of each call if
+    'events' was True.
+    """
+    def __init__(self, events=True):
+        self.stages = {}
+        self.events = [] if events else None
+        self.__lock = threading.Lock()
+
+    def __call__(self, event):
+        with self.__lock:
+            if self.events is not None:
+                self.events.append(event)
+            totals = self.stages.setdefault(event['stage'],
+                                            {'calls': 0, 'time': 0.0,
+                                             'bytes_read': 0,
+                                             'bytes_allocated': 0,
+                                             'peak_memory': None})
+            totals['calls'] += 1
+            totals['time'] += event['time']
+            totals['bytes_read'] += event['bytes_read']
+            totals['bytes_allocated'] += event['bytes_allocated']
+            if event['peak_memory'] is not None:
+                totals['peak_memory'] = max(totals['peak_memory'] or 0,
+                                            event['peak_memory'])
+
+    def __getitem__(self, stage):
+        return self.stages[stage]
+
+    def __str__(self):
+        lines = ['%-20s %8s %10s %12s %12s %12s' % ('stage', 'calls', 'time [s]',
+                                                   'read [B]', 'alloc [B]',
+                                                   'peak [B]')]
+        for stage, totals in self.stages.items():
+            lines.append('%-20s %8d %10.4f %12d %12d %12s' % (
+                stage, totals['calls'], totals['time'], totals['bytes_read'],
+                totals['bytes_allocated'], totals['peak_memory']))
+        return '\n'.join(lines)
+
+class Stage:
+    """
+    Measures one call of a stage. Amounts known only inside the call are
+    added by record().
+    """
+    def __init__(self, name, info):
+        self.event = dict(info, stage=name, bytes_read=0, bytes_allocated=0,
+                          peak_memory=None)
+
+    def record(self, bytes_read=0, bytes_allocated=0, **info):
+        self.event['bytes_read'] += bytes_read
+        self.event['bytes_allocated'] += bytes_allocated
+        self.event.update(info)
+
+    def __enter__(self):
+        stages = getattr(local, 'stages', None)
+        if stages is None:
+            stages = local.stages = []
+        stages.append(self)
+        self.tracing = tracemalloc.is_tracing()
+        if self.tracing:
+            #the peak of the enclosing stage is kept on the stack
+            stack = getattr(local, 'stack', None)
+            if stack is None:
+                stack = local.stack = []
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1] = max(stack[-1], peak)
+            stack.append(current)
+            self.start_memory = current
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.event['time'] = time.perf_counter() - self.start
+        local.stages.pop()
+        if self.tracing:
+            peak = max(local.stack.pop(), tracemalloc.get_traced_memory()[1])
+            self.event['peak_memory'] = peak - self.start_memory
+            if local.stack:
+                local.stack[-1] = max(local.stack[-1], peak)
+        for sink in list(sinks):
+            sink(self.event)
+
+class NullStage:
+    """
+    Stand-in for Stage while measuring is off.
+    """
+    def record(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+NULL_STAGE = NullStage()
+
+def stage(name, **info):
+    """
+    Returns a context manager measuring a call of stage 'name', with 'info'
+    added to its event. It does nothing while measuring is off.
+    """
+    if not sinks:
+        return NULL_STAGE
+    return Stage(name, info)
+
+def record(**amounts):
+    """
+    Adds 'amounts' (see Stage.record()) to the innermost stage measured in 
+    this thread. It does nothing if no stage is measured.
+    """
+    stages = getattr(local, 'stages', None)
+    if stages:
+        stages[-1].record(**amounts)
+
+def add_callback(callback):
+    """
+    Registers a function called with the event dict of each measured call:
+    'stage', 'time', 'bytes_read', 'bytes_allocated', 'peak_memory' and
+    stage specific entries like 'file'. It may be called from several
+    threads at once.
+    """
+    with sinks_lock:
+        sinks.append(callback)
+
+def remove_callback(callback):
+    with sinks_lock:
+        sinks.remove(callback)
+
+@contextmanager
+def instrument(trace_memory=False, callback=None, events=True):
+    """
+    Measures the stages run in the block and returns their Stats. If
+    'trace_memory' is True, tracemalloc is started for the block (if it is
+    not running already) and peak memory is measured. 'callback' is called
+    with each event too, see add_callback(). With events=False only the
+    totals are kept.
+    """
+    global memory_tracers, tracing_started
+    stats = Stats(events)
+    if trace_memory:
+        with sinks_lock:
+            if memory_tracers == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                tracing_started = True
+            memory_tracers += 1
+    add_callback(stats)
+    if callback is not None:
+        add_callback(callback)
+    try:
+        yield stats
+    finally:
+        remove_callback(stats)
+        if callback is not None:
+            remove_callback(callback)
+        if trace_memory:
+            with sinks_lock:
+                memory_tracers -= 1
+                if memory_tracers == 0 and tracing_started:
+                    tracemalloc.stop()
+                    tracing_started = False
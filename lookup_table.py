@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+
+Pixel to flux surface lookup tables. The maps of rasterizer.rasterize() for 
+a camera view and a selection of surfaces are written to disk once and 
+memory-mapped on later requests, so mapping camera pixels to surfaces or 
+effective radii is a plain array index.
+
+Tables are stored in a folder per table, named by a hash of the projection 
+parameters, the image shape, the surface files (with their size and 
+modification time), the selected lines, toroidal bins and direction, and 
+the mapped values. Each map is a .npy file in it.
+"""
+
+import hashlib
+import os
+import shutil
+import numpy as np
+
+from .rasterizer import rasterize
+
+#changing this invalidates existing tables
+TABLE_VERSION = 1
+
+MAPS = ('hits', 'surface', 'depth')
+
+def table_key(projector, handler, values=()):
+    """
+    Returns the hash identifying the lookup table of 'projector' and the 
+    current selection of 'handler'. No surface file is read, only their 
+    size and modification time.
+    """
+    key = hashlib.sha1()
+    def add(*items):
+        for item in items:
+            key.update(repr(item).encode() if not isinstance(item, np.ndarray) 
+                       else np.ascontiguousarray(item, dtype=np.float64).tobytes())
+            key.update(b'\x00')
+    add(TABLE_VERSION, tuple(projector.image_shape()))
+    add(*projector.projection_kernel())
+    #the selection as given, defaults would need a surface file decoded
+    add(*handler.return_selection())
+    for file in handler.return_surface_files():
+        stat = os.stat(file)
+        add(os.path.abspath(file), stat.st_size, stat.st_mtime_ns)
+    add(handler.return_surfaces(), tuple(values))
+    return key.hexdigest()
+
+def table_dir(handler, cache_dir=None):
+    """
+    Returns where tables are kept: 'cache_dir', the cache folder of the 
+    handler, or a 'lookup_tables' folder next to the surface files.
+    """
+    if cache_dir is None:
+        cache_dir = handler.cache_dir
+    if cache_dir is None:
+        cache_dir = handler.path
+    return os.path.join(cache_dir, 'lookup_tables')
+
+def load_table(path, values=()):
+    """
+    Memory-maps the maps of a table folder. Returns None if it does not 
+    exist.
+    """
+    if not os.path.isdir(path):
+        return None
+    return {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r') 
+            for name in MAPS + tuple(values)}
+
+def pixel_lookup_table(projector, handler, values=('reff',), cache_dir=None, 
+                       chunk=1, overwrite=False):
+    """
+    Returns the lookup table of the view of 'projector' and the surfaces 
+    selected in 'handler': a dict of read-only memory-mapped maps of the 
+    image shape, 'hits', 'surface', 'depth' and one for each fs_info entry 
+    in 'values' (see rasterizer.rasterize()). The table is made and written 
+    to disk if it does not exist yet or 'overwrite' is True, and is read 
+    from the disk otherwise.
+    """
+    values = tuple(values)
+    path = os.path.join(table_dir(handler, cache_dir), 
+                        table_key(projector, handler, values))
+    table = None if overwrite else load_table(path, values)
+    if table is not None:
+        return table
+
+    maps = rasterize(projector, handler, values=list(values), chunk=chunk)
+    tmp_path = path + '.%d.tmp' % os.getpid()
+    os.makedirs(tmp_path, exist_ok=True)
+    for name in MAPS + values:
+        np.save(os.path.join(tmp_path, name + '.npy'), maps[name])
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        #another process has written the same table meanwhile
+        shutil.rmtree(tmp_path)
+    return load_table(path, values)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+
+Rasterization of projected field lines into per-pixel maps of a camera 
+image, instead of plotting them line by line. Field lines are drawn as 
+segments between consecutive toroidal bins, sampled about once per pixel. 
+For each pixel the maps give the number of samples that hit it, the index of 
+the surface nearest to the camera, its distance (depth), and per-surface 
+values like the effective radius of that surface.
+
+The nearest sample of each pixel is found by a vectorized z-buffer, which 
+zbuffer() also offers for plain points: far side lines do not cover near 
+ones.
+"""
+
+import numpy as np
+
+from .image_projector import CHUNK_SIZE, point_source
+
+def rasterize(projector, field_lines, surfaces=None, values=None, chunk=1, 
+              max_samples=None, mode='segments'):
+    """
+    Rasterizes field lines in the image of 'projector'.
+
+    parameters:
+    projector: an ImageProjector
+    field_lines: array-like of shape (3, lines, tor[, surfaces]), e.g. the 
+        (lazy) field lines of a FieldLineHandler, or the handler itself
+    surfaces: labels of the surfaces in the surface map, by default their 
+        index, or the surface numbers of a handler
+    values: dict of per-surface values, e.g. {'reff': reff}. Each gives a 
+        map of the value of the nearest surface. For a handler, names of 
+        fs_info entries can be given in a list, e.g. ['reff', 'iota'].
+    chunk: number of surfaces rasterized at once
+    max_samples: upper limit of samples per segment, by default the 
+        perimeter of the image
+    mode: 'segments' draws the segments between consecutive points, 
+        'points' is a plain z-buffer of the field-line points: each pixel 
+        keeps the nearest point projected into it
+
+    Returns a dict of maps of the image shape: 'hits' (int), 'surface' (-1 
+    where there are no hits), 'depth' (inf where there are no hits) and one 
+    for each of 'values' (nan where there are no hits).
+    """
+    if hasattr(field_lines, 'return_fs_info'):
+        handler = field_lines
+        if surfaces is None:
+            surfaces = handler.return_surfaces()
+        if values is not None and not isinstance(values, dict):
+            fs_info = handler.return_fs_info()
+            values = {name: np.asarray(fs_info[name])[handler.return_surfaces()] 
+                      for name in values}
+    field_lines = point_source(field_lines)
+    single = len(field_lines.shape) == 3
+    count = 1 if single else field_lines.shape[3]
+    surfaces = np.arange(count) if surfaces is None else np.asarray(surfaces)
+    values = {} if values is None else {name: np.asarray(value) 
+                                        for name, value in values.items()}
+
+    if mode not in ('segments', 'points'):
+        raise ValueError(f'Unknown rasterization mode: {mode}')
+    shape = projector.image_shape()
+    if max_samples is None:
+        max_samples = 2 * (shape[0] + shape[1])
+    hits = np.zeros(shape[0] * shape[1], dtype=np.int64)
+    depth = np.full(shape[0] * shape[1], np.inf)
+    nearest = np.full(shape[0] * shape[1], -1, dtype=np.intp)
+    for start in range(0, count, chunk):
+        if single:
+            points = np.asarray(field_lines[...])[..., np.newaxis]
+        else:
+            points = np.asarray(field_lines[..., start:start + chunk])
+        pixels = projector.calc_pixel_coord(points)
+        distance = projector.calc_depth(points)
+        index = np.broadcast_to(np.arange(start, start + points.shape[3]), 
+                                distance.shape)
+        if mode == 'points':
+            flat, sample_depth, sample_surface = sample_points(
+                pixels, distance, index, shape)
+        else:
+            flat, sample_depth, sample_surface = sample_segments(
+                pixels, distance, index, shape, max_samples)
+        hits += np.bincount(flat, minlength=hits.size)
+        update_nearest(depth, nearest, flat, sample_depth, sample_surface)
+
+    hit = nearest >= 0
+    maps = {'hits': hits.reshape(shape), 'depth': depth.reshape(shape)}
+    surface = np.full(hits.size, -1, dtype=surfaces.dtype)
+    surface[hit] = surfaces[nearest[hit]]
+    maps['surface'] = surface.reshape(shape)
+    for name, value in values.items():
+        value_map = np.full(hits.size, np.nan)
+        value_map[hit] = value[nearest[hit]]
+        maps[name] = value_map.reshape(shape)
+    return maps
+
+def sample_segments(pixels, depth, index, shape, max_samples):
+    """
+    Samples the segments between consecutive points along the third axis of 
+    'pixels' (2, lines, tor, surfaces) about once per pixel. Segments with 
+    an end behind the camera or both ends on the same side out of the image 
+    are dropped. Depth is interpolated linearly in its inverse, which is 
+    linear along the image. Returns the flat pixel index, the depth and the 
+    'index' of the segment of each sample in the image.
+    """
+    start = pixels[:, :, :-1].reshape(2, -1)
+    end = pixels[:, :, 1:].reshape(2, -1)
+    inverse_start = 1 / depth[:, :-1].reshape(-1)
+    inverse_end = 1 / depth[:, 1:].reshape(-1)
+    index = index[:, :-1].reshape(-1)
+    upper = np.array([[shape[1] - 0.5], [shape[0] - 0.5]])
+    keep = (inverse_start > 0) & (inverse_end > 0)
+    keep &= ~((start < -0.5) & (end < -0.5)).any(axis=0)
+    keep &= ~((start >= upper) & (end >= upper)).any(axis=0)
+    start, end = start[:, keep], end[:, keep]
+    inverse_start, inverse_end = inverse_start[keep], inverse_end[keep]
+    index = index[keep]
+
+    #the last point of a segment is the first of the next one
+    samples = np.ceil(np.abs(end - start).max(axis=0))
+    samples = np.clip(samples, 1, max_samples).astype(np.intp)
+    segment = np.repeat(np.arange(len(samples)), samples)
+    offsets = np.cumsum(samples) - samples
+    fraction = (np.arange(len(segment)) - offsets[segment]) / samples[segment]
+    x = start[:, segment] + (end - start)[:, segment] * fraction
+    inverse = inverse_start[segment] + \
+              (inverse_end - inverse_start)[segment] * fraction
+
+    column = np.rint(x[0]).astype(np.intp)
+    row = np.rint(x[1]).astype(np.intp)
+    inside = (column >= 0) & (column < shape[1]) & (row >= 0) & (row < shape[0])
+    flat = row[inside] * shape[1] + column[inside]
+    return flat, 1 / inverse[inside], index[segment[inside]]
+
+def sample_points(pixels, depth, index, shape):
+    """
+    Returns the flat pixel index, the depth and the 'index' of the points of 
+    'pixels' (2, ...) that are in the image and in front of the camera.
+    """
+    column = np.rint(pixels[0]).reshape(-1)
+    row = np.rint(pixels[1]).reshape(-1)
+    depth = depth.reshape(-1)
+    inside = (column >= 0) & (column < shape[1]) & (row >= 0) & \
+             (row < shape[0]) & (depth > 0)
+    flat = row[inside].astype(np.intp) * shape[1] + column[inside].astype(np.intp)
+    return flat, depth[inside], index.reshape(-1)[inside]
+
+def update_nearest(depth, nearest, flat, sample_depth, sample_index):
+    """
+    Writes the depth and index of the nearest sample of each pixel into the 
+    flat maps 'depth' and 'nearest', where it is nearer than their values.
+    """
+    #samples behind the current map cannot win, dropping them keeps the sort 
+    #short once the map is filled
+    nearer = sample_depth < depth[flat]
+    flat, sample_depth = flat[nearer], sample_depth[nearer]
+    sample_index = sample_index[nearer]
+    order = np.lexsort((sample_depth, flat))
+    flat = flat[order]
+    first = np.ones(len(flat), dtype=bool)
+    first[1:] = flat[1:] != flat[:-1]
+    order = order[first]
+    flat = flat[first]
+    depth[flat] = sample_depth[order]
+    nearest[flat] = sample_index[order]
+
+def zbuffer(projector, points, chunk_size=None):
+    """
+    Z-buffer of points of shape (3, ...) in the image of 'projector'. 
+    Returns a map of the depth of the nearest point projected into each 
+    pixel (inf where there is none) and a map of its flat index in 
+    points[0] (-1 where there is none). Points are processed 'chunk_size' at 
+    a time, by default CHUNK_SIZE.
+    """
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE
+    shape = projector.image_shape()
+    depth = np.full(shape[0] * shape[1], np.inf)
+    nearest = np.full(shape[0] * shape[1], -1, dtype=np.intp)
+    points = np.reshape(points, (3, -1))
+    for start in range(0, points.shape[1], chunk_size):
+        chunk = points[:, start:start + chunk_size]
+        flat, sample_depth, sample_index = sample_points(
+            projector.calc_pixel_coord(chunk), projector.calc_depth(chunk), 
+            np.arange(start, start + chunk.shape[1]), shape)
+        update_nearest(depth, nearest, flat, sample_depth, sample_index)
+    return depth.reshape(shape), nearest.reshape(shape)
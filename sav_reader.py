@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+
+Selective reader of IDL save files. scipy's readsav decodes every variable
+and every field of a file, while reading field lines usually needs only a few
+fields of the 'surface' structure. read_struct_fields() walks the XDR records
+of the file and decodes only the requested fields of the first element of a
+structure variable. The rest are skipped without being converted, and the
+walk stops after the last requested field, so compressed records are only
+decompressed up to that point.
+
+The format is described in Craig Markwardt's Unofficial Format Specification
+for IDL .sav files (http://cow.physics.wisc.edu/~craigm/idl/savefmt). Only
+what flux surface files use is supported: SavFormatError is raised for
+anything else (heap pointers, objects, nested structures in requested
+fields), so callers can fall back to readsav.
+"""
+
+import os
+import struct
+import zlib
+import numpy as np
+
+from .errors import SavFormatError
+from .instrumentation import record
+
+#IDL type codes of numeric data and their XDR dtypes
+DTYPES = {1: '>u1', 2: '>i2', 3: '>i4', 4: '>f4', 5: '>f8', 6: '>c8',
+          9: '>c16', 12: '>u2', 13: '>u4', 14: '>i8', 15: '>u8'}
+
+#record types used here
+VARIABLE = 2
+END_MARKER = 6
+
+class CountingFile:
+    """
+    File wrapper counting the bytes read, skipped parts are not counted.
+    """
+    def __init__(self, f):
+        self.f = f
+        self.bytes_read = 0
+
+    def read(self, n=-1):
+        data = self.f.read(n)
+        self.bytes_read += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        return self.f.seek(offset, whence)
+
+    def tell(self):
+        return self.f.tell()
+
+class FileStream:
+    """
+    Reads the body of an uncompressed record directly from the file.
+    """
+    def __init__(self, f):
+        self.f = f
+
+    def read(self, n):
+        data = self.f.read(n)
+        if len(data) != n:
+            raise SavFormatError('Unexpected end of file.')
+        return data
+
+    def skip(self, n):
+        self.f.seek(n, 1)
+
+    def align(self):
+        pos = self.f.tell()
+        if pos % 4:
+            self.f.seek(4 - pos % 4, 1)
+
+class ZlibStream:
+    """
+    Decompresses the body of a compressed record only as far as it is read.
+    """
+    chunk_size = 1 << 20
+
+    def __init__(self, f, length):
+        self.f = f
+        self.remaining = length
+        self.decompressor = zlib.decompressobj()
+        self.buffer = bytearray()
+        self.offset = 0
+        self.pos = 0
+
+    def __fill(self, n):
+        while len(self.buffer) - self.offset < n:
+            data = self.decompressor.unconsumed_tail
+            if not data:
+                if self.remaining <= 0:
+                    raise SavFormatError('Unexpected end of compressed record.')
+                data = self.f.read(min(self.chunk_size, self.remaining))
+                if not data:
+                    raise SavFormatError('Unexpected end of file.')
+                self.remaining -= len(data)
+            del self.buffer[:self.offset]
+            self.offset = 0
+            self.buffer += self.decompressor.decompress(data, self.chunk_size)
+
+    def read(self, n):
+        self.__fill(n)
+        data = bytes(self.buffer[self.offset:self.offset + n])
+        self.offset += n
+        self.pos += n
+        return data
+
+    def skip(self, n):
+        self.pos += n
+        while n > 0:
+            step = min(n, self.chunk_size)
+            self.__fill(step)
+            self.offset += step
+            n -= step
+
+    def align(self):
+        #record bodies start at a 4 byte boundary
+        if self.pos % 4:
+            self.skip(4 - self.pos % 4)
+
+def read_long(s):
+    return struct.unpack('>l', s.read(4))[0]
+
+def read_uint64(s):
+    return struct.unpack('>Q', s.read(8))[0]
+
+def read_string(s):
+    length = read_long(s)
+    if length <= 0:
+        return ''
+    chars = s.read(length).decode('latin1')
+    s.align()
+    return chars
+
+def read_string_data(s):
+    length = read_long(s)
+    if length <= 0:
+        return b''
+    length = read_long(s)
+    data = s.read(length)
+    s.align()
+    return data
+
+def read_struct_fields(file, varname, fields):
+    """
+    Reads the fields with the given indices of the first element of the
+    structure variable 'varname'. Returns a dict from field index to value.
+    Arrays keep the big-endian dtype and the axis order readsav gives them.
+    The bytes read from the file are recorded to the stage being measured.
+    """
+    with open(file, 'rb') as f:
+        f = CountingFile(f)
+        try:
+            return read_fields(f, file, varname, set(fields))
+        finally:
+            record(bytes_read=f.bytes_read)
+
+def read_fields(f, file, varname, fields):
+    """
+    Walks the records of an open file for read_struct_fields().
+    """
+    structs = {}
+    signature = f.read(4)
+    if signature == b'SR\x00\x04':
+        compressed = False
+    elif signature == b'SR\x00\x06':
+        compressed = True
+    else:
+        raise SavFormatError('Not an IDL save file.')
+
+    while True:
+        header = f.read(16)
+        if len(header) != 16:
+            raise SavFormatError('Unexpected end of file.')
+        rectype, low, high = struct.unpack('>lII', header[:12])
+        nextrec = low + (high << 32)
+        if rectype == END_MARKER:
+            break
+        if rectype == VARIABLE:
+            if compressed:
+                s = ZlibStream(f, nextrec - f.tell())
+            else:
+                s = FileStream(f)
+            name = read_string(s)
+            typedesc = read_typedesc(s, structs)
+            if name.lower() == varname.lower():
+                if not typedesc['structure']:
+                    raise SavFormatError(f'{varname} is not a structure.')
+                if read_long(s) != 7:
+                    raise SavFormatError('VARSTART is not 7.')
+                return read_struct_element(s, typedesc['struct_desc'],
+                                           fields)
+        f.seek(nextrec)
+    raise SavFormatError(f'No variable {varname} in {file}.')
+
+def read_typedesc(s, structs):
+    typedesc = {'typecode': read_long(s)}
+    varflags = read_long(s)
+    if varflags & 2:
+        raise SavFormatError('System variables are not supported.')
+    typedesc['array'] = varflags & 4 == 4
+    typedesc['structure'] = varflags & 32 == 32
+    if typedesc['structure']:
+        typedesc['array_desc'] = read_arraydesc(s)
+        typedesc['struct_desc'] = read_structdesc(s, structs)
+    elif typedesc['array']:
+        typedesc['array_desc'] = read_arraydesc(s)
+    return typedesc
+
+def read_arraydesc(s):
+    arrstart = read_long(s)
+    if arrstart == 8:
+        s.skip(4)
+        nbytes = read_long(s)
+        nelements = read_long(s)
+        ndims = read_long(s)
+        s.skip(8)
+        nmax = read_long(s)
+        dims = [read_long(s) for i in range(nmax)]
+    elif arrstart == 18:
+        s.skip(8)
+        nbytes = read_uint64(s)
+        nelements = read_uint64(s)
+        ndims = read_long(s)
+        s.skip(8)
+        dims = []
+        for i in range(8):
+            s.skip(4)
+            dims.append(read_long(s))
+    else:
+        raise SavFormatError(f'Unknown ARRSTART: {arrstart}')
+    #IDL dimensions are reversed compared to numpy
+    shape = tuple(reversed(dims[:ndims])) if ndims > 1 else (nelements,)
+    return {'nbytes': nbytes, 'nelements': nelements, 'shape': shape}
+
+def read_structdesc(s, structs):
+    if read_long(s) != 9:
+        raise SavFormatError('STRUCTSTART is not 9.')
+    name = read_string(s)
+    predef = read_long(s)
+    ntags = read_long(s)
+    read_long(s)
+    if predef & 1:
+        if name not in structs:
+            raise SavFormatError(f'Structure {name} is not defined.')
+        return structs[name]
+    if predef & 6:
+        raise SavFormatError('Object structures are not supported.')
+    tags = []
+    for i in range(ntags):
+        if read_long(s) == -1:
+            read_uint64(s)
+        typecode = read_long(s)
+        tagflags = read_long(s)
+        tags.append({'typecode': typecode, 'array': tagflags & 4 == 4,
+                     'structure': tagflags & 32 == 32})
+    for tag in tags:
+        tag['name'] = read_string(s)
+    for tag in tags:
+        if tag['array']:
+            tag['array_desc'] = read_arraydesc(s)
+    for tag in tags:
+        if tag['structure']:
+            tag['struct_desc'] = read_structdesc(s, structs)
+    structdesc = {'name': name, 'tags': tags}
+    structs[name] = structdesc
+    return structdesc
+
+def read_struct_element(s, structdesc, fields):
+    """
+    Reads the requested fields of one structure element and stops after the
+    last one.
+    """
+    data = {}
+    last = max(fields, default=-1)
+    for i, tag in enumerate(structdesc['tags']):
+        if i > last:
+            break
+        if tag['structure']:
+            if i in fields:
+                raise SavFormatError('Nested structures are not supported.')
+            skip_structure(s, tag)
+        elif tag['array']:
+            if i in fields:
+                data[i] = read_array(s, tag['typecode'], tag['array_desc'])
+            else:
+                skip_array(s, tag['typecode'], tag['array_desc'])
+        else:
+            value = read_scalar(s, tag['typecode'])
+            if i in fields:
+                data[i] = value
+    missing = fields - set(data)
+    if missing:
+        raise SavFormatError(f'Fields {sorted(missing)} are not in the structure.')
+    return data
+
+def skip_structure(s, tag):
+    for i in range(tag['array_desc']['nelements']):
+        for sub in tag['struct_desc']['tags']:
+            if sub['structure']:
+                skip_structure(s, sub)
+            elif sub['array']:
+                skip_array(s, sub['typecode'], sub['array_desc'])
+            else:
+                read_scalar(s, sub['typecode'])
+
+def array_nbytes(s, typecode, array_desc):
+    """
+    Returns the number of bytes of a numeric array in the file.
+    """
+    if typecode == 1:
+        #byte arrays repeat their length before the data
+        return read_long(s)
+    if typecode in (2, 12):
+        #16 bit values are padded to 32 bits
+        return array_desc['nbytes'] * 2
+    return array_desc['nbytes']
+
+def read_array(s, typecode, array_desc):
+    if typecode == 7:
+        data = [read_string_data(s) for i in range(array_desc['nelements'])]
+        return np.array(data, dtype=np.object_).reshape(array_desc['shape'])
+    if typecode not in DTYPES:
+        raise SavFormatError(f'Arrays of type {typecode} are not supported.')
+    data = np.frombuffer(s.read(array_nbytes(s, typecode, array_desc)),
+                         dtype=DTYPES[typecode])
+    if typecode in (2, 12):
+        data = data[1::2]
+    s.align()
+    return data.reshape(array_desc['shape'])
+
+def skip_array(s, typecode, array_desc):
+    if typecode in DTYPES:
+        s.skip(array_nbytes(s, typecode, array_desc))
+        s.align()
+    else:
+        for i in range(array_desc['nelements']):
+            read_scalar(s, typecode)
+
+def read_scalar(s, typecode):
+    if typecode == 7:
+        return read_string_data(s)
+    if typecode == 1:
+        read_long(s)
+        return np.uint8(s.read(4)[0])
+    if typecode in (2, 12):
+        return np.frombuffer(s.read(4)[2:], dtype=DTYPES[typecode])[0]
+    if typecode in (10, 11):
+        raise SavFormatError('Pointers are not supported.')
+    if typecode in DTYPES:
+        dtype = np.dtype(DTYPES[typecode])
+        size = max(dtype.itemsize, 4)
+        return np.frombuffer(s.read(size)[:dtype.itemsize], dtype=dtype)[0]
+    raise SavFormatError(f'Unknown IDL type: {typecode}')
+
+def readsav(file, *args, **kwargs):
+    """
+    scipy.io.readsav, imported on the first call. Importing scipy.io takes
+    longer than reading most surface files, and it is only needed for files
+    read_struct_fields() does not support. It reads the whole file, which is 
+    recorded to the stage being measured.
+    """
+    from scipy.io import readsav
+    data = readsav(file, *args, **kwargs)
+    record(bytes_read=os.path.getsize(file))
+    return data
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+
+Conversion of flux surface .sav files to a native binary cache. Decoding the
+IDL save files is the slowest part of reading field lines, so each surface can
+be converted once to a .npy file, which is memory-mapped on later reads.
+
+The cache file of a surface holds a single array of shape
+(18, lines, toroidal bins). Its rows are the record fields 4-21 of the
+'surface' structure in their original order: forward x, y, z and backward
+x, y, z of the field line coordinates, the magnetic field and its gradient.
+
+Decoded surfaces can also be kept in memory by a process-wide LRU cache, 
+shared_cache, so handlers reading the same configuration decode each surface 
+only once. It holds whole decoded fields, not just the selected lines and 
+bins, so it is off by default and turned on by giving it a byte budget with 
+shared_cache.set_budget(); 0 turns it off again. A budget smaller than the 
+surfaces read in turn gives no hits, as each surface is evicted before it 
+is read again. It is filled by FieldLineHandler.load_data() in the calling 
+process only: worker processes, lazy views and iter_surfaces() do not keep 
+what they decode.
+
+Usage from the command line:
+    python -m flap_field_lines.surface_cache [-c CACHE_DIR] [-w WORKERS] PATH...
+where PATH is a surface file or a directory of surface files.
+"""
+
+import argparse
+import os
+import threading
+import numpy as np
+
+from collections import OrderedDict
+
+from concurrent.futures import ProcessPoolExecutor
+
+from .errors import SavFormatError
+from .sav_reader import read_struct_fields, readsav
+
+#record field of the first and number of cached fields
+FIRST_FIELD = 4
+N_FIELDS = 18
+
+#default byte budget of the shared in-memory cache, off unless set
+MEMORY_BUDGET = 0
+
+class CachedSurface:
+    """
+    Record-like wrapper of a cached surface array. Indexing it with a record
+    field number returns the same data as the 'surface' record of the .sav
+    file.
+    """
+    def __init__(self, data):
+        self.data = data
+
+    def __getitem__(self, index_no):
+        return self.data[index_no - FIRST_FIELD]
+
+class SurfaceMemoryCache:
+    """
+    LRU cache of decoded surface data in memory. Values are dicts of record 
+    fields, their size is the total size of the arrays in them. The least 
+    recently used entries are evicted when the total size would exceed 
+    'max_bytes'. Values larger than that are not stored. Safe to use from 
+    several threads.
+    """
+    def __init__(self, max_bytes=MEMORY_BUDGET):
+        self.max_bytes = max_bytes
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def get(self, key):
+        """
+        Returns the value stored for 'key' and marks it as recently used, or 
+        None if it is not in the cache.
+        """
+        with self.__lock:
+            if key in self.__entries:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return self.__entries[key][0]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        nbytes = sum(np.asarray(data).nbytes for data in value.values())
+        with self.__lock:
+            if key in self.__entries:
+                self.nbytes -= self.__entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return
+            self.__entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            self.__evict(self.max_bytes)
+
+    def set_budget(self, max_bytes):
+        """
+        Sets the byte budget and evicts entries above it.
+        """
+        with self.__lock:
+            self.max_bytes = max_bytes
+            self.__evict(max_bytes)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """
+        Returns a dict of hit, miss and eviction counts and the memory used.
+        """
+        with self.__lock:
+            return {'hits': self.hits, 'misses': self.misses, 
+                    'evictions': self.evictions, 'entries': len(self.__entries), 
+                    'nbytes': self.nbytes, 'max_bytes': self.max_bytes}
+
+    def reset_stats(self):
+        with self.__lock:
+            self.hits = self.misses = self.evictions = 0
+
+    def __evict(self, max_bytes):
+        while self.nbytes > max_bytes:
+            _, (value, nbytes) = self.__entries.popitem(last=False)
+            self.nbytes -= nbytes
+            self.evictions += 1
+
+#cache shared by all handlers of the process
+shared_cache = SurfaceMemoryCache()
+
+def cache_file_name(file, cache_dir=None):
+    """
+    Returns the cache file path of a surface file. If 'cache_dir' is None,
+    the cache is kept next to the surface file.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.dirname(file)
+    name = os.path.splitext(os.path.basename(file))[0] + '.npy'
+    return os.path.join(cache_dir, name)
+
+def is_cache_valid(file, cache_file):
+    """
+    True if 'cache_file' exists and is not older than the surface file.
+    """
+    try:
+        return os.stat(cache_file).st_mtime_ns >= os.stat(file).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+def decode_surface_file(file, fields=None):
+    """
+    Decodes the 'surface' record of a .sav file. If 'fields' is given, only 
+    those record fields are decoded by sav_reader and a dict from field 
+    number to data is returned. The whole file is decoded by readsav if 
+    'fields' is None or sav_reader does not support the file.
+    """
+    if fields is not None:
+        try:
+            return read_struct_fields(file, 'surface', fields)
+        except SavFormatError:
+            pass
+    return readsav(file)['surface'][0]
+
+def open_surface_file(file, cache_dir=None, fields=None):
+    """
+    Returns the 'surface' record of a surface file. A valid cache file is
+    memory-mapped, otherwise the .sav file is decoded by 
+    decode_surface_file(), reading only 'fields' if they are given.
+    """
+    cache_file = cache_file_name(file, cache_dir)
+    if is_cache_valid(file, cache_file):
+        return CachedSurface(np.load(cache_file, mmap_mode='r'))
+    return decode_surface_file(file, fields)
+
+def convert_surface_file(file, cache_dir=None, overwrite=False):
+    """
+    Writes the cache file of a surface file and returns its path. Existing
+    valid cache files are kept unless 'overwrite' is True. The file is
+    written under a temporary name and renamed, so readers never see a
+    partial cache.
+    """
+    cache_file = cache_file_name(file, cache_dir)
+    if not overwrite and is_cache_valid(file, cache_file):
+        return cache_file
+    record = decode_surface_file(file, range(FIRST_FIELD, 
+                                             FIRST_FIELD + N_FIELDS))
+    data = np.stack([record[i] for i in range(FIRST_FIELD,
+                                              FIRST_FIELD + N_FIELDS)])
+    os.makedirs(os.path.dirname(cache_file) or '.', exist_ok=True)
+    tmp_file = cache_file + '.%d.tmp' % os.getpid()
+    with open(tmp_file, 'wb') as f:
+        np.save(f, data)
+    os.replace(tmp_file, cache_file)
+    return cache_file
+
+def convert_surface_files(files, cache_dir=None, overwrite=False, workers=None):
+    """
+    Converts a list of surface files. Files are converted by a process pool
+    if 'workers' is larger than one. Returns the list of cache files.
+    """
+    if workers is not None and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(convert_surface_file, file, cache_dir,
+                                       overwrite) for file in files]
+            return [future.result() for future in futures]
+    return [convert_surface_file(file, cache_dir, overwrite) for file in files]
+
+def find_surface_files(path):
+    """
+    Lists the surface files in a directory, or returns the path itself if
+    it is a file.
+    """
+    if os.path.isfile(path):
+        return [path]
+    return sorted(os.path.join(path, name) for name in os.listdir(path)
+                  if '_surf_' in name and name.endswith('.sav'))
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Convert flux surface .sav files to .npy cache files.')
+    parser.add_argument('paths', nargs='+',
+                        help='surface files or directories of surface files')
+    parser.add_argument('-c', '--cache-dir', default=None,
+                        help='where to write the cache files, default is '
+                             'next to the surface files')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='number of conversion processes')
+    parser.add_argument('-f', '--overwrite', action='store_true',
+                        help='rewrite cache files that are up to date')
+    args = parser.parse_args(args)
+    files = [file for path in args.paths for file in find_surface_files(path)]
+    for cache_file in convert_surface_files(files, args.cache_dir,
+                                            args.overwrite, args.workers):
+        print(cache_file)
+
+if __name__ == '__main__':
+    main()
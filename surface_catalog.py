@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+
+Catalog of the surface files of a directory. The directory is listed once
+and its ..._surf_NNN.sav files are indexed by configuration and surface
+number, with their size and modification time at the time of the listing.
+Selecting surfaces then needs no file system access, which matters on
+network file systems where every probe is a round trip.
+
+surface_catalog() keeps one catalog per directory and lists it again only
+when the modification time of the directory changes, that is, when files
+are added, removed or renamed.
+"""
+
+import os
+import re
+import threading
+
+from collections import namedtuple
+
+#name of the surface files, with the configuration and the surface number
+SURFACE_FILE = re.compile(
+    re.escape('field_lines_tor_ang_1.85_1turn_') + r'(?P<configuration>.+?)' +
+    re.escape('+252_w_o_limiters_w_o_torsion_w_characteristics_surf_') +
+    r'(?P<number>\d+)\.sav$')
+
+#number of any surface file name
+SURFACE_NUMBER = re.compile(r'_surf_(?P<number>\d+)\.sav$')
+
+SurfaceEntry = namedtuple('SurfaceEntry', ['name', 'size', 'mtime_ns'])
+
+class SurfaceCatalog:
+    """
+    Surface files of a directory by configuration and surface number.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.mtime_ns = directory_mtime(path)
+        self.__entries = {}
+        if self.mtime_ns is None:
+            #a missing directory has no surfaces
+            return
+        with os.scandir(path) as it:
+            for entry in it:
+                match = SURFACE_FILE.match(entry.name)
+                if match is None or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                surfaces = self.__entries.setdefault(match['configuration'], {})
+                number = int(match['number'])
+                #of two names of the same surface, e.g. surf_7 and surf_007,
+                #the padded one is kept
+                if number in surfaces and \
+                        len(surfaces[number].name) > len(entry.name):
+                    continue
+                surfaces[number] = SurfaceEntry(entry.name, stat.st_size,
+                                                stat.st_mtime_ns)
+
+    def configurations(self):
+        return sorted(self.__entries)
+
+    def surfaces(self, configuration):
+        """
+        Sorted surface numbers of a configuration.
+        """
+        return sorted(self.__entries.get(configuration, {}))
+
+    def entry(self, configuration, number):
+        """
+        Returns the SurfaceEntry of a surface, or None if it has no file.
+        """
+        return self.__entries.get(configuration, {}).get(number)
+
+    def files(self, configuration, numbers, path=None):
+        """
+        Returns the files and the numbers of the surfaces in 'numbers' that
+        have a file, in the order of 'numbers'. Files are joined to 'path',
+        by default the path the catalog was made with.
+        """
+        path = self.path if path is None else path
+        surfaces = self.__entries.get(configuration, {})
+        found = [number for number in numbers if number in surfaces]
+        return [os.path.join(path, surfaces[number].name) for number in found], found
+
+#catalogs by absolute path
+catalogs = {}
+catalog_lock = threading.Lock()
+
+def surface_catalog(path):
+    """
+    Returns the SurfaceCatalog of a directory, listing it only if it was
+    not listed yet or was changed since.
+    """
+    key = os.path.abspath(path)
+    mtime_ns = directory_mtime(key)
+    with catalog_lock:
+        catalog = catalogs.get(key)
+    if catalog is None or catalog.mtime_ns != mtime_ns:
+        catalog = SurfaceCatalog(path)
+        with catalog_lock:
+            catalogs[key] = catalog
+    return catalog
+
+def directory_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def surface_number(file):
+    """
+    Parses the surface number of a surface file name.
+    """
+    match = SURFACE_NUMBER.search(os.path.basename(file))
+    if match is None:
+        raise ValueError(f'{file} is not a surface file name.')
+    return int(match['number'])
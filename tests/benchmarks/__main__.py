@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+
+Runs the benchmarks without asv. Benchmarks follow asv's conventions: 
+classes with time_* methods, 'params' and 'param_names', optional setup, 
+teardown and setup_cache, whose return value is passed first to the others.
+
+Usage:
+    python -m flap_field_lines.tests.benchmarks [-k FILTER] [-r REPEAT]
+"""
+
+import argparse
+import inspect
+import itertools
+import time
+
+from . import benchmark_field_line_handler, benchmark_image_projector, benchmark_import
+
+MODULES = [benchmark_field_line_handler, benchmark_image_projector, benchmark_import]
+
+def benchmark_classes(modules=MODULES):
+    for module in modules:
+        for name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ == module.__name__ and any(
+                    attr.startswith('time_') for attr in dir(cls)):
+                yield cls
+
+def run_benchmark(cls, method, repeat=3, selection=''):
+    """
+    Times 'method' of 'cls' for each combination of its parameters and 
+    returns a list of (name, best time in seconds).
+    """
+    benchmark = cls()
+    params = getattr(cls, 'params', [])
+    combinations = list(itertools.product(*params))
+    names = ['%s.%s(%s)' % (cls.__name__, method, ', '.join(map(str, combination))) 
+             for combination in combinations]
+    if not any(selection in name for name in names):
+        return []
+    cache = [benchmark.setup_cache()] if hasattr(benchmark, 'setup_cache') else []
+    results = []
+    for name, combination in zip(names, combinations):
+        if selection not in name:
+            continue
+        args = cache + list(combination)
+        if hasattr(benchmark, 'setup'):
+            benchmark.setup(*args)
+        try:
+            times = []
+            for i in range(repeat):
+                start = time.perf_counter()
+                getattr(benchmark, method)(*args)
+                times.append(time.perf_counter() - start)
+        finally:
+            if hasattr(benchmark, 'teardown'):
+                benchmark.teardown(*args)
+        results.append((name, min(times)))
+    return results
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Run the benchmarks.')
+    parser.add_argument('-k', '--filter', default='', 
+                        help='run only benchmarks whose name contains this')
+    parser.add_argument('-r', '--repeat', type=int, default=3, 
+                        help='number of runs, the best is reported')
+    args = parser.parse_args(args)
+    for cls in benchmark_classes():
+        for method in sorted(attr for attr in dir(cls) if attr.startswith('time_')):
+            for name, seconds in run_benchmark(cls, method, args.repeat, 
+                                               args.filter):
+                print('%-70s %10.4f s' % (name, seconds), flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+
+Timing of FieldLineHandler reading on synthetic surface files of the real 
+size (360 lines x 3651 bins, zlib compressed like the W7X files). The shared 
+memory cache is turned off, so every load decodes the files.
+"""
+
+import os
+import tempfile
+
+import flap_field_lines.surface_cache as sc
+from flap_field_lines.field_line_handler import FieldLineHandler
+from flap_field_lines.image_projector import ImageProjector
+
+from ..synthetic_data import write_configuration
+
+SURFACES = [1, 4]
+
+#quantities read besides the field lines: getB, getGradB
+QUANTITIES = {'lines': (False, False), 'B': (True, False), 'B+gradB': (True, True)}
+
+def write_benchmark_configuration():
+    path = os.path.join(tempfile.gettempdir(), 'flap_field_lines_benchmark')
+    fs_info = os.path.join(path, 'fs_info.sav')
+    if not os.path.isfile(fs_info):
+        write_configuration(path + '.tmp', surfaces=range(max(SURFACES)), 
+                            compress=True)
+        os.replace(path + '.tmp', path)
+    return fs_info
+
+class NoMemoryCache:
+    def setup(self, *args):
+        self.budget = sc.shared_cache.max_bytes
+        sc.shared_cache.set_budget(0)
+
+    def teardown(self, *args):
+        sc.shared_cache.set_budget(self.budget)
+
+class LoadData(NoMemoryCache):
+    """
+    update_read_parameters() and load_data() of all lines and bins.
+    """
+    params = [SURFACES, ['forward', 'backward', 'both'], list(QUANTITIES)]
+    param_names = ['surfaces', 'direction', 'quantities']
+    timeout = 600
+
+    def setup_cache(self):
+        return write_benchmark_configuration()
+
+    def time_load_data(self, fs_info, surfaces, direction, quantities):
+        handler = FieldLineHandler(fs_info, 'EIM')
+        handler.update_read_parameters(surfaces='0:%d' % surfaces, 
+                                       direction=direction)
+        handler.load_data(*QUANTITIES[quantities])
+
+class LoadSelection(NoMemoryCache):
+    """
+    Loading every 10th line and bin, from the .sav files and from the .npy 
+    cache.
+    """
+    params = [SURFACES, ['sav', 'npy']]
+    param_names = ['surfaces', 'source']
+    timeout = 600
+
+    def setup_cache(self):
+        fs_info = write_benchmark_configuration()
+        cache_dir = os.path.join(os.path.dirname(fs_info), 'npy')
+        handler = FieldLineHandler(fs_info, 'EIM')
+        handler.update_read_parameters()
+        sc.convert_surface_files(handler.return_surface_files(), cache_dir)
+        return fs_info
+
+    def time_load_data(self, fs_info, surfaces, source):
+        cache_dir = os.path.join(os.path.dirname(fs_info), source)
+        handler = FieldLineHandler(fs_info, 'EIM', cache_dir=cache_dir)
+        handler.update_read_parameters(surfaces='0:%d' % surfaces, 
+                                       lines='0:360:10', tor_range='0:3651:10')
+        handler.load_data()
+
+class ProjectSurfaces(NoMemoryCache):
+    """
+    Reading and projecting surfaces one by one, with 'prefetch' surfaces read 
+    in the background meanwhile, against load_data() and one projection.
+    """
+    params = [['load_data', 0, 2]]
+    param_names = ['prefetch']
+    timeout = 600
+
+    def setup_cache(self):
+        return write_benchmark_configuration()
+
+    def time_project_surfaces(self, fs_info, prefetch):
+        handler = FieldLineHandler(fs_info, 'EIM')
+        handler.update_read_parameters(surfaces='0:%d' % max(SURFACES))
+        projector = ImageProjector.from_file('AEQ21', '20160217', 'phot')
+        if prefetch == 'load_data':
+            handler.load_data()
+            projector.calc_pixel_coord(handler.return_field_lines())
+        else:
+            for surface, field_lines, B, gradB in handler.iter_surfaces(
+                    prefetch=prefetch):
+                projector.calc_pixel_coord(field_lines)
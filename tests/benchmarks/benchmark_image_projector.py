@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+
+Timing of ImageProjector.calc_pixel_coord on arrays of field line sized 
+inputs: a line, a surface and several surfaces, in one view and in several 
+views one by one or at once.
+"""
+
+import numpy as np
+
+from flap_field_lines.image_projector import ImageProjector, MultiViewProjector
+
+SHAPES = {'3x3651': (3, 3651), '3x360x3651': (3, 360, 3651), 
+          '3x360x3651x4': (3, 360, 3651, 4)}
+
+class CalcPixelCoord:
+    params = [list(SHAPES)]
+    param_names = ['shape']
+
+    def setup(self, shape):
+        self.projector = ImageProjector.from_file('AEQ21', '20160217', 'phot')
+        rng = np.random.default_rng(0)
+        self.points = rng.uniform(-6, 6, SHAPES[shape])
+
+    def time_calc_pixel_coord(self, shape):
+        self.projector.calc_pixel_coord(self.points)
+
+#views with their first calibration in views2.txt
+VIEWS = [('AEQ20', '20160308', 'edicam'), ('AEQ21', '20160217', 'phot'), 
+         ('AEQ31', '20160218', 'edicam'), ('AEQ40', '20160225', 'edicam'), 
+         ('AEQ41', '20160308', 'edicam'), ('AEQ50', '20160308', 'edicam'), 
+         ('AEQ51', '20150713', 'pixelfly'), ('AEA21', '20221207', 'phot')]
+
+class MultiViewCalcPixelCoord:
+    params = [[1, 8], ['loop', 'batch']]
+    param_names = ['views', 'method']
+
+    def setup(self, views, method):
+        self.projectors = [ImageProjector.from_file(*view) for view in VIEWS[:views]]
+        self.multi_view = MultiViewProjector(self.projectors)
+        rng = np.random.default_rng(0)
+        self.points = rng.uniform(-6, 6, (3, 360, 3651))
+
+    def time_calc_pixel_coord(self, views, method):
+        if method == 'loop':
+            for projector in self.projectors:
+                projector.calc_pixel_coord(self.points)
+        else:
+            self.multi_view.calc_pixel_coord(self.points)
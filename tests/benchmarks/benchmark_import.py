@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+
+Timing of importing the package and its core modules in a new interpreter. 
+The core modules should import only numpy, matplotlib and scipy are 
+imported when the functions using them are called.
+"""
+
+import os
+import subprocess
+import sys
+
+import flap_field_lines
+
+#directory containing the package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(flap_field_lines.__file__)))
+
+IMPORTS = {'package': 'import flap_field_lines',
+           'field_line_handler': 'import flap_field_lines.field_line_handler',
+           'image_projector': 'import flap_field_lines.image_projector',
+           'core': 'import flap_field_lines.field_line_handler, '
+                   'flap_field_lines.image_projector'}
+
+class Import:
+    params = [list(IMPORTS)]
+    param_names = ['modules']
+
+    def setup(self, modules):
+        self.env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+            filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+
+    def time_import(self, modules):
+        subprocess.run([sys.executable, '-c', IMPORTS[modules]], env=self.env, 
+                       check=True)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+
+Writer of synthetic IDL save files with the layout of the W7X flux surface
+files, so that reading can be tested and benchmarked without the real data.
+Only what these files use is supported: numeric scalars and arrays, string
+arrays and single element structures of them.
+"""
+
+import os
+import struct
+import zlib
+import numpy as np
+
+SURF_FILE = 'field_lines_tor_ang_1.85_1turn_%s+252_w_o_limiters_w_o_torsion_w_characteristics_surf_%03d.sav'
+
+#IDL type codes of numpy dtypes
+TYPECODES = {np.dtype('uint8'): 1, np.dtype('int16'): 2, np.dtype('int32'): 3,
+             np.dtype('float32'): 4, np.dtype('float64'): 5,
+             np.dtype('int64'): 14}
+
+def pack_long(value):
+    return struct.pack('>l', value)
+
+def pack_string(string):
+    data = string.encode('latin1')
+    return pack_long(len(data)) + pad(data)
+
+def pad(data):
+    return data + b'\x00' * (-len(data) % 4)
+
+def arraydesc(array):
+    nbytes = array.nbytes if array.dtype.kind != 'S' else array.size
+    dims = list(reversed(array.shape)) + [0] * (8 - array.ndim)
+    return b''.join(pack_long(v) for v in
+                    [8, 0, nbytes, array.size, array.ndim, 0, 0, 8] + dims)
+
+def typecode(value):
+    if isinstance(value, (bytes, str)) or value.dtype.kind == 'S':
+        return 7
+    return TYPECODES[value.dtype]
+
+def pack_scalar(value):
+    if isinstance(value, (bytes, str)):
+        value = value.encode('latin1') if isinstance(value, str) else value
+        return pack_long(len(value)) + pack_long(len(value)) + pad(value)
+    data = np.asarray(value).astype(value.dtype.newbyteorder('>')).tobytes()
+    if value.dtype.itemsize == 1:
+        return pack_long(1) + data + b'\x00' * 3
+    if value.dtype.itemsize == 2:
+        return b'\x00\x00' + data
+    return data
+
+def pack_array(array):
+    if array.dtype.kind == 'S':
+        return b''.join(pack_scalar(bytes(v)) for v in array.ravel())
+    if array.dtype.itemsize == 2:
+        #16 bit values are padded to 32 bits
+        data = array.astype('>i4').tobytes()
+    else:
+        data = array.astype(array.dtype.newbyteorder('>')).tobytes()
+    if array.dtype.itemsize == 1:
+        data = pack_long(len(data)) + data
+    return pad(data)
+
+def structdesc(name, tags):
+    data = [pack_long(9), pack_string(name), pack_long(0),
+            pack_long(len(tags)), pack_long(0)]
+    for value in tags.values():
+        flags = 4 if isinstance(value, np.ndarray) and value.ndim > 0 else 0
+        data += [pack_long(0), pack_long(typecode(value)), pack_long(flags)]
+    data += [pack_string(tag.upper()) for tag in tags]
+    data += [arraydesc(value) for value in tags.values()
+             if isinstance(value, np.ndarray) and value.ndim > 0]
+    return b''.join(data)
+
+def pack_value(value):
+    if isinstance(value, np.ndarray) and value.ndim > 0:
+        return pack_array(value)
+    return pack_scalar(value)
+
+def variable_body(name, tags):
+    """
+    Body of a VARIABLE record holding a one element structure.
+    """
+    one = np.zeros(1)
+    data = [pack_string(name.upper()), pack_long(8), pack_long(36),
+            arraydesc(one)[:8] + pack_long(0) + arraydesc(one)[12:],
+            structdesc(name.upper(), tags), pack_long(7)]
+    data += [pack_value(value) for value in tags.values()]
+    return b''.join(data)
+
+def write_sav(file, name, tags, compress=False):
+    """
+    Writes an IDL save file with a single structure variable 'name'. 'tags'
+    is a dict of its fields: numpy arrays, numpy scalars or bytes.
+    """
+    records = [(2, variable_body(name, tags))]
+    with open(file, 'wb') as f:
+        f.write(b'SR\x00\x06' if compress else b'SR\x00\x04')
+        for rectype, body in records:
+            if compress:
+                body = zlib.compress(body)
+            nextrec = f.tell() + 16 + len(body)
+            f.write(struct.pack('>lIII', rectype, nextrec % 2**32,
+                                nextrec // 2**32, 0))
+            f.write(body)
+        nextrec = f.tell() + 16
+        f.write(struct.pack('>lIII', 6, nextrec, 0, 0))
+
+def surface_tags(number, lines=360, tor=3651, dtype=np.float64):
+    """
+    Fields of a synthetic 'surface' structure: 4 scalars, then forward and
+    backward x, y, z of the field lines, the magnetic field and its gradient
+    in fields 4-21. The field lines lie on a torus whose minor radius grows
+    with the surface number.
+    """
+    phi = np.linspace(0, 2*np.pi, tor, dtype=np.float64)
+    theta = np.linspace(0, 2*np.pi, lines, endpoint=False)[:, np.newaxis]
+    r = 0.05 + 0.005 * number
+    R = 5.5 + r * np.cos(theta + 5 * phi / 4)
+    tags = {'surf_no': np.int32(number), 'iota': np.float64(1.25),
+            'reff': np.float64(r), 'phi0': np.float64(0)}
+    for quantity, scale in (('', 1), ('b_', 2.5), ('gradb_', 0.1)):
+        for direction, sign in (('f', 1), ('b', -1)):
+            x = scale * R * np.cos(sign * phi)
+            y = scale * R * np.sin(sign * phi)
+            z = scale * r * np.sin(theta + 5 * phi / 4) * np.ones_like(x)
+            for axis, data in zip('xyz', (x, y, z)):
+                tags[quantity + axis + direction] = data.astype(dtype)
+    return tags
+
+def fs_info_tags(surfaces=95):
+    """
+    Fields of a synthetic 'fs_info' structure, with iota, reff, the
+    separatrices, island names and flags in fields 3, 4, 6, 7 and 8.
+    """
+    flags = np.zeros(surfaces, dtype=np.int32)
+    flags[surfaces//2:] = 1
+    return {'config': b'EIM', 'n': np.int32(surfaces), 'phi': np.float64(0),
+            'iota': np.linspace(0.85, 1.05, surfaces),
+            'reff': np.linspace(0.01, 0.55, surfaces), 'volume': np.float64(30),
+            'separatrix': np.array([surfaces//2, surfaces - 1], dtype=np.int32),
+            'names': np.array([b'main', b'island_1']),
+            'flags': flags}
+
+def write_configuration(path, configuration='EIM', surfaces=range(10),
+                        lines=360, tor=3651, compress=False):
+    """
+    Writes fs_info.sav and the surface files of a synthetic configuration to
+    'path'. Returns the path of fs_info.sav.
+    """
+    os.makedirs(path, exist_ok=True)
+    fs_info = os.path.join(path, 'fs_info.sav')
+    write_sav(fs_info, 'fs_info', fs_info_tags(max(surfaces) + 1))
+    for number in surfaces:
+        write_sav(os.path.join(path, SURF_FILE % (configuration, number)),
+                  'surface', surface_tags(number, lines, tor), compress)
+    return fs_info
@@ -5,11 +5,24 @@ Created on Tue June 4 2021
 @author: lordofbejgli
 """
 
+import asyncio
+import threading
 import unittest
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
+import numpy as np
+
+import flap_field_lines.field_line_handler as flh
+import flap_field_lines.flux_surface_info as fsi
+import flap_field_lines.surface_cache as sc
 from flap_field_lines.field_line_handler import *
 from flap_field_lines.errors import *
 
+from ..synthetic_data import write_configuration
+
 try:
     from ..config import data_path
 except ImportError:
@@ -42,6 +55,36 @@ class TestAccessories(unittest.TestCase):
         self.assertRaises(ValueError, process_selection, 'retek')
         self.assertRaises(ValueError, process_selection, '5:10:2:3')
 
+    def test_extract_data_from_surf(self):
+        """
+        Slices, index arrays and selections across both directions should
+        give the same data as fancy indexing the stacked record, written into
+        'out' if it is given.
+        """
+        rng = np.random.default_rng(0)
+        record = [None] * 4 + [rng.standard_normal((6, 10)).astype('>f8')
+                               for i in range(6)]
+        forward = np.array(record[4:7])
+        both = np.concatenate((np.array(record[7:10])[:, :, ::-1], forward),
+                              axis=2)
+        for lines, tor in ((range(6), range(20)), ([5, 1, 3], range(19, 0, -4)),
+                           (range(1, 6, 2), [9, 10, 3, 15]), ([-1, 0], [2, 11, 4, 13])):
+            expected = both[:, lines][:, :, tor]
+            data = extract_data_from_surf(record, 4, lines, tor, 'both')
+            self.assertEqual(data.dtype, np.float64)
+            self.assertTrue(np.array_equal(data, expected))
+        out = np.zeros((3, 2, 4, 2))
+        extract_data_from_surf(record, 4, [1, 2], range(0, 8, 2), 'forward',
+                               out=out[..., 1])
+        self.assertTrue(np.array_equal(out[..., 1], forward[:, 1:3, 0:8:2]))
+        self.assertFalse(out[..., 0].any())
+        backward = {i: record[i] for i in range(7, 10)}
+        self.assertTrue(np.array_equal(
+            extract_data_from_surf(backward, 4, [2, 0], range(3, 8), 'backward'),
+            np.array(record[7:10])[:, [2, 0], 3:8]))
+        self.assertRaises(IndexError, extract_data_from_surf, record, 4, [6],
+                          range(10), 'forward')
+
 class TestFieldLineHandlerConstructor(unittest.TestCase):
     """
     These tests check the FieldLineHandler constructor with various correct or 
@@ -110,6 +153,528 @@ class TestFieldLineHandlerFunctions(unittest.TestCase):
         self.handler.update_read_parameters(surfaces=40, drop_data=False)
         self.assertEqual(len(self.handler.return_surface_files()), 2)
 
+SURF_FILE = 'field_lines_tor_ang_1.85_1turn_EIM+252_w_o_limiters_w_o_torsion_w_characteristics_surf_%03d.sav'
+
+def fake_readsav(file, *args, **kwargs):
+    """
+    Stand-in for scipy's readsav. Returns a small fs_info or a surface record 
+    with 18 (12 x 40) arrays in fields 4-21, seeded by the file name so that 
+    each surface is different but reproducible.
+    """
+    name = os.path.basename(file)
+    if name == 'fs_info.sav':
+        info = [None, None, None, np.linspace(0.8, 1, 20), np.linspace(0, 0.5, 20), 
+                None, np.array([15, 3]), np.array([b'x', b'island']), np.zeros(20)]
+        return {'fs_info': [info]}
+    rng = np.random.default_rng(zlib.crc32(name.encode()))
+    record = [None] * 4 + [rng.standard_normal((12, 40)) for i in range(18)]
+    return {'surface': [tuple(record)]}
+
+class SyntheticSurfaces(unittest.TestCase):
+    """
+    Base of tests that run without the W7X data. Surface files are empty 
+    placeholders and readsav is replaced by fake_readsav. The shared memory 
+    cache is replaced by an empty one with no budget, so every read decodes.
+    """
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = self.tmp.name
+        for name in ['fs_info.sav'] + [SURF_FILE % i for i in range(0, 20, 2)]:
+            open(os.path.join(self.path, name), 'w').close()
+        for module in (fsi, sc):
+            patcher = mock.patch.object(module, 'readsav', fake_readsav)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.memory_cache = sc.SurfaceMemoryCache(max_bytes=0)
+        patcher = mock.patch.object(flh, 'shared_cache', self.memory_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+        self.handler = FieldLineHandler(os.path.join(self.path, 'fs_info.sav'), 'EIM')
+
+    def surface(self, number, index_no=4):
+        """
+        Returns the forward data of one fake surface.
+        """
+        record = fake_readsav(SURF_FILE % number)['surface'][0]
+        return np.array(record[index_no:index_no + 3])
+
+class TestLoadingSynthetic(SyntheticSurfaces):
+    """
+    Loading tests on synthetic surfaces.
+    """
+
+    def test_load_multiple_surfaces(self):
+        self.handler.update_read_parameters(surfaces=(2, 4, 6), lines=(1, 3, 5),
+                                            tor_range='0:30:5')
+        self.handler.load_data(getB=True)
+        field_lines = self.handler.return_field_lines()
+        self.assertEqual(field_lines.shape, (3, 3, 6, 3))
+        for i, surf in enumerate((2, 4, 6)):
+            expected = self.surface(surf)[:, [1, 3, 5]][:, :, 0:30:5]
+            self.assertTrue(np.array_equal(field_lines[..., i], expected))
+            expected = self.surface(surf, 10)[:, [1, 3, 5]][:, :, 0:30:5]
+            self.assertTrue(np.array_equal(self.handler.return_B()[..., i], expected))
+
+    def test_extend_loaded_data(self):
+        self.handler.update_read_parameters(surfaces=4)
+        self.handler.load_data()
+        self.assertEqual(self.handler.return_field_lines().shape, (3, 12, 40))
+        self.handler.update_read_parameters(surfaces=(6, 8), drop_data=False)
+        self.handler.load_data()
+        field_lines = self.handler.return_field_lines()
+        self.assertEqual(field_lines.shape, (3, 12, 40, 3))
+        for i, surf in enumerate((4, 6, 8)):
+            self.assertTrue(np.array_equal(field_lines[..., i], self.surface(surf)))
+
+    def test_incremental_load(self):
+        """
+        Requesting B and gradB after the coordinates should read only those,
+        and keep the loaded coordinates.
+        """
+        self.handler.update_read_parameters(surfaces=(2, 4, 6))
+        self.handler.load_data()
+        field_lines = self.handler.return_field_lines()
+        with mock.patch.object(flh, 'decode_surface_file',
+                                wraps=flh.decode_surface_file) as decode:
+            self.handler.load_data(getB=True)
+            self.assertEqual(decode.call_count, 3)
+            self.assertEqual(list(decode.call_args[0][1]), [10, 11, 12])
+            self.handler.load_data()
+            self.assertEqual(decode.call_count, 3)
+            self.assertIs(field_lines, self.handler.return_field_lines())
+            self.handler.update_read_parameters(surfaces=8, drop_data=False)
+            self.handler.load_data(getGradB=True)
+            self.assertEqual(decode.call_count, 7)
+        for i, surf in enumerate((2, 4, 6, 8)):
+            self.assertTrue(np.array_equal(self.handler.return_field_lines()[..., i],
+                                           self.surface(surf)))
+            self.assertTrue(np.array_equal(self.handler.return_B()[..., i],
+                                           self.surface(surf, 10)))
+            self.assertTrue(np.array_equal(self.handler.return_gradB()[..., i],
+                                           self.surface(surf, 16)))
+
+    def test_reslice_in_memory(self):
+        """
+        Narrowing the selection of lines, toroidal bins, direction or surfaces
+        should be served from the loaded data, widening it should read again.
+        """
+        self.handler.update_read_parameters(surfaces=(2, 4, 6), direction='both')
+        self.handler.load_data(getB=True)
+        with mock.patch.object(flh, 'decode_surface_file',
+                                wraps=flh.decode_surface_file) as decode:
+            self.handler.update_read_parameters(surfaces=(2, 4, 6), lines='1:9:2',
+                                                tor_range='-1:-30:-3',
+                                                direction='backward')
+            self.handler.load_data()
+            self.handler.update_read_parameters(surfaces=(6, 2), lines='1:9:2',
+                                                tor_range='-1:-30:-3',
+                                                direction='backward')
+            self.handler.load_data(getB=True)
+            self.assertEqual(decode.call_count, 0)
+            for i, surf in enumerate((6, 2)):
+                expected = self.surface(surf, 7)[:, 1:9:2][:, :, -1:-30:-3]
+                self.assertTrue(np.array_equal(
+                    self.handler.return_field_lines()[..., i], expected))
+                expected = self.surface(surf, 13)[:, 1:9:2][:, :, -1:-30:-3]
+                self.assertTrue(np.array_equal(self.handler.return_B()[..., i],
+                                               expected))
+            #a new selection asks only for field lines, as before
+            self.handler.update_read_parameters(surfaces=(2, 6), tor_range='0:10')
+            self.handler.load_data()
+            self.assertIsNone(self.handler.return_B())
+            self.assertEqual(decode.call_count, 0)
+            #forward bins are covered, new surfaces are read
+            self.handler.update_read_parameters(surfaces=8, drop_data=False)
+            self.handler.load_data()
+            self.assertEqual(decode.call_count, 1)
+            for i, surf in enumerate((2, 6, 8)):
+                expected = self.surface(surf)[:, 1:9:2, 0:10]
+                self.assertTrue(np.array_equal(
+                    self.handler.return_field_lines()[..., i], expected))
+
+        self.handler.update_read_parameters(surfaces=(2, 4), lines='0:4',
+                                            tor_range='0:10')
+        self.handler.drop_data()
+        self.handler.load_data()
+        with mock.patch.object(flh, 'decode_surface_file',
+                                wraps=flh.decode_surface_file) as decode:
+            self.handler.update_read_parameters(surfaces=(2, 4), lines='2:6',
+                                                tor_range='0:10')
+            self.handler.load_data()
+            self.assertEqual(decode.call_count, 2)
+        for i, surf in enumerate((2, 4)):
+            self.assertTrue(np.array_equal(self.handler.return_field_lines()[..., i],
+                                           self.surface(surf)[:, 2:6, 0:10]))
+
+    def test_out_of_range_selection(self):
+        """
+        Lines and toroidal bins out of range should raise IndexError instead
+        of wrapping around, negative ones in range count from the end.
+        """
+        self.handler.update_read_parameters(surfaces=(2, 4), lines=(13,))
+        self.assertRaises(IndexError, self.handler.load_data)
+        for direction in ('forward', 'backward'):
+            self.handler.update_read_parameters(surfaces=(2, 4), lines=':',
+                                                tor_range='35:45',
+                                                direction=direction)
+            self.assertRaises(IndexError, self.handler.load_data)
+        self.handler.update_read_parameters(surfaces=(2, 4), lines=(-1,),
+                                            tor_range='-40:-35',
+                                            direction='backward')
+        self.handler.load_data()
+        for i, surf in enumerate((2, 4)):
+            self.assertTrue(np.array_equal(self.handler.return_field_lines()[..., i],
+                                           self.surface(surf, 7)[:, [11], 0:5]))
+        #getters give None for a selection out of range, load_data() raises
+        self.handler.update_read_parameters(surfaces=(2, 4), lines=(13,),
+                                            direction='backward')
+        self.assertIsNone(self.handler.return_field_lines())
+        self.assertRaises(IndexError, self.handler.load_data)
+        #the default selection is derived again for a new direction
+        handler = FieldLineHandler(os.path.join(self.path, 'fs_info.sav'), 'EIM')
+        handler.update_read_parameters(surfaces=(2, 4), direction='both')
+        handler.load_data()
+        self.assertEqual(handler.return_field_lines().shape, (3, 12, 80, 2))
+        handler.update_read_parameters(direction='forward')
+        self.assertEqual(handler.return_field_lines().shape, (3, 12, 40, 2))
+        for i, surf in enumerate((2, 4)):
+            self.assertTrue(np.array_equal(handler.return_field_lines()[..., i],
+                                           self.surface(surf)))
+        #given selections are kept
+        handler.update_read_parameters(tor_range='50:60', direction='both')
+        handler.update_read_parameters(direction='forward')
+        self.assertIsNone(handler.return_field_lines())
+        self.assertRaises(IndexError, handler.load_data)
+
+    def test_shared_memory_cache(self):
+        """
+        Handlers should share decoded surfaces through the memory cache, and 
+        the least recently used ones should be evicted above the budget.
+        """
+        #one quantity of a surface in one direction is 3 arrays of 12 x 40
+        entry = 3 * 12 * 40 * 8
+        self.memory_cache.set_budget(4 * entry)
+        self.handler.update_read_parameters(surfaces=(2, 4))
+        self.handler.load_data(getB=True)
+        self.assertEqual(self.memory_cache.stats()['misses'], 4)
+        other = FieldLineHandler(os.path.join(self.path, 'fs_info.sav'), 'EIM')
+        other.update_read_parameters(surfaces=(2, 4), lines='0:5', 
+                                     tor_range='3:9')
+        with mock.patch.object(flh, 'decode_surface_file') as decode:
+            other.load_data(getB=True)
+        decode.assert_not_called()
+        for i, surf in enumerate((2, 4)):
+            self.assertTrue(np.array_equal(other.return_B()[..., i],
+                                           self.surface(surf, 10)[:, 0:5, 3:9]))
+        stats = self.memory_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (4, 4))
+        self.assertEqual((stats['entries'], stats['nbytes']), (4, 4 * entry))
+
+        #surface 2 was used first, its entries are evicted
+        other.update_read_parameters(surfaces=6)
+        other.load_data()
+        stats = self.memory_cache.stats()
+        self.assertEqual((stats['entries'], stats['evictions']), (4, 1))
+        self.assertEqual(stats['nbytes'], 4 * entry)
+        self.memory_cache.set_budget(entry)
+        self.assertEqual(len(self.memory_cache), 1)
+
+        #both directions serve a single direction
+        self.memory_cache.clear()
+        self.memory_cache.set_budget(4 * entry)
+        other.update_read_parameters(surfaces=6, direction='both')
+        other.load_data()
+        self.memory_cache.reset_stats()
+        third = FieldLineHandler(os.path.join(self.path, 'fs_info.sav'), 'EIM')
+        third.update_read_parameters(surfaces=6, direction='backward')
+        third.load_data()
+        self.assertEqual(self.memory_cache.stats()['hits'], 1)
+        self.assertTrue(np.array_equal(third.return_field_lines(), 
+                                       self.surface(6, 7)))
+
+        #a scan of more surfaces than the budget holds gets no hits
+        self.memory_cache.clear()
+        self.memory_cache.set_budget(2 * entry)
+        self.memory_cache.reset_stats()
+        for i in range(2):
+            scan = FieldLineHandler(os.path.join(self.path, 'fs_info.sav'), 'EIM')
+            scan.update_read_parameters(surfaces=(2, 4, 6))
+            scan.load_data()
+        self.assertEqual(self.memory_cache.stats()['hits'], 0)
+
+        #the cache is off by default
+        self.assertEqual(sc.shared_cache.max_bytes, 0)
+        default = sc.SurfaceMemoryCache()
+        default.put('key', {4: np.zeros(3)})
+        self.assertEqual(len(default), 0)
+
+    def test_float32(self):
+        self.handler.update_read_parameters(surfaces=(2, 4), direction='both')
+        self.handler.load_data(getB=True, dtype=np.float32)
+        field_lines = self.handler.return_field_lines()
+        self.assertEqual(field_lines.dtype, np.float32)
+        self.assertEqual(self.handler.return_B().dtype, np.float32)
+        self.handler.load_data(dtype=np.float64)
+        self.assertEqual(self.handler.return_field_lines().dtype, np.float64)
+        self.assertTrue(np.array_equal(self.handler.return_field_lines()
+                                       .astype(np.float32), field_lines))
+        #narrowing converts the loaded data
+        with mock.patch.object(flh, 'decode_surface_file') as decode:
+            self.handler.load_data(getB=True, dtype=np.float32)
+        decode.assert_not_called()
+        self.assertTrue(np.array_equal(self.handler.return_field_lines(), 
+                                       field_lines))
+        self.assertEqual(self.handler.return_field_lines(lazy=True).dtype, 
+                         np.float32)
+
+    def test_iter_surfaces(self):
+        """
+        Iterating should give the loaded data surface by surface, reading at 
+        most 'prefetch' surfaces ahead and nothing after the iteration stops.
+        """
+        self.handler.update_read_parameters(surfaces=(2, 4, 6, 8), lines='1:9:2', 
+                                            tor_range='-1:-30:-3', direction='both')
+        self.handler.load_data(getB=True)
+        field_lines = self.handler.return_field_lines()
+        B = self.handler.return_B()
+        for prefetch in (0, 1, 3):
+            items = list(self.handler.iter_surfaces(getB=True, prefetch=prefetch, 
+                                                    workers=2))
+            self.assertEqual([item[0] for item in items], [2, 4, 6, 8])
+            for i, (surface, lines, b, gradB) in enumerate(items):
+                self.assertTrue(np.array_equal(lines, field_lines[..., i]))
+                self.assertTrue(np.array_equal(b, B[..., i]))
+                self.assertIsNone(gradB)
+
+        with mock.patch.object(flh, 'read_surface_file', 
+                               wraps=read_surface_file) as read:
+            surfaces = self.handler.iter_surfaces(prefetch=2, dtype=np.float32)
+            surface, lines, b, gradB = next(surfaces)
+            self.assertLessEqual(read.call_count, 3)
+            self.assertEqual(lines.dtype, np.float32)
+            self.assertIsNone(b)
+            surfaces.close()
+            count = read.call_count
+        self.assertLessEqual(count, 3)
+        self.assertRaises(ValueError, list, self.handler.iter_surfaces(pool='retek'))
+
+        #streamed surfaces are not kept in the memory cache
+        self.memory_cache.set_budget(2**30)
+        other = FieldLineHandler(os.path.join(self.path, 'fs_info.sav'), 'EIM')
+        other.update_read_parameters(surfaces=(2, 4, 6, 8))
+        for item in other.iter_surfaces(getB=True, prefetch=1):
+            pass
+        self.assertEqual(len(self.memory_cache), 0)
+        self.assertIsNone(other.return_field_lines())
+
+    def test_load_data_async(self):
+        """
+        The coroutines should give the same data as load_data(), report 
+        progress per surface and keep what was read when cancelled.
+        """
+        self.handler.update_read_parameters(surfaces=(2, 4, 6, 8), lines='1:9:2', 
+                                            direction='both')
+        self.handler.load_data(getB=True)
+        field_lines = self.handler.return_field_lines()
+        B = self.handler.return_B()
+        other = FieldLineHandler(os.path.join(self.path, 'fs_info.sav'), 'EIM')
+        other.update_read_parameters(surfaces=(2, 4, 6, 8), lines='1:9:2', 
+                                     direction='both')
+        third = FieldLineHandler(os.path.join(self.path, 'fs_info.sav'), 'EIM')
+        third.update_read_parameters(surfaces=(4, 6), lines='1:9:2', 
+                                     direction='both')
+        calls = []
+        asyncio.run(load_all_async([other, third], getB=True, 
+                                   progress=lambda *args: calls.append(args)))
+        self.assertTrue(np.array_equal(other.return_field_lines(), field_lines))
+        self.assertTrue(np.array_equal(other.return_B(), B))
+        self.assertTrue(np.array_equal(third.return_B(), B[..., 1:3]))
+        self.assertEqual([args[1:] for args in calls if args[0] is other], 
+                         [(1, 4, 2), (2, 4, 4), (3, 4, 6), (4, 4, 8)])
+        self.assertEqual(len(calls), 6)
+
+        async def cancelled(handler):
+            task = asyncio.current_task()
+            def progress(done, total, surface):
+                if done == 1:
+                    task.cancel()
+            await handler.load_data_async(progress=progress)
+        handler = FieldLineHandler(os.path.join(self.path, 'fs_info.sav'), 'EIM')
+        handler.update_read_parameters(surfaces=(2, 4, 6, 8), lines='1:9:2', 
+                                       direction='both')
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(cancelled(handler))
+        self.assertEqual(handler.read_files, [False, False, True, True])
+        handler.load_data()
+        self.assertTrue(np.array_equal(handler.return_field_lines(), field_lines))
+
+        #the conversion of the loaded data runs in the executor
+        threads = []
+        set_dtype = FieldLineHandler._FieldLineHandler__set_dtype
+        def record_thread(handler, dtype):
+            threads.append(threading.current_thread().name)
+            set_dtype(handler, dtype)
+        with ThreadPoolExecutor(1, thread_name_prefix='load') as executor, \
+                mock.patch.object(FieldLineHandler, '_FieldLineHandler__set_dtype', 
+                                  record_thread):
+            asyncio.run(handler.load_data_async(dtype=np.float32, 
+                                                executor=executor))
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('load'))
+        self.assertEqual(handler.return_field_lines().dtype, np.float32)
+
+    def test_iter_surfaces_async(self):
+        self.handler.update_read_parameters(surfaces=(2, 4, 6, 8), lines='1:9:2', 
+                                            direction='both')
+        expected = list(self.handler.iter_surfaces(getGradB=True, prefetch=0))
+        async def collect(prefetch, stop=None):
+            items = []
+            async for item in self.handler.iter_surfaces_async(
+                    getGradB=True, prefetch=prefetch):
+                items.append(item)
+                if len(items) == stop:
+                    break
+            return items
+        for prefetch in (0, 2):
+            self.handler = FieldLineHandler(os.path.join(self.path, 'fs_info.sav'), 'EIM')
+            self.handler.update_read_parameters(surfaces=(2, 4, 6, 8), lines='1:9:2', 
+                                                direction='both')
+            items = asyncio.run(collect(prefetch))
+            self.assertEqual([item[0] for item in items], [2, 4, 6, 8])
+            for item, reference in zip(items, expected):
+                self.assertTrue(np.array_equal(item[1], reference[1]))
+                self.assertIsNone(item[2])
+                self.assertTrue(np.array_equal(item[3], reference[3]))
+        self.assertEqual(len(asyncio.run(collect(1, stop=2))), 2)
+
+        #every file is opened in the given executor, the first one too
+        threads = []
+        def record_thread(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return open_surface_quantities(*args, **kwargs)
+        async def collect_in(executor):
+            return [item async for item in self.handler.iter_surfaces_async(
+                executor=executor)]
+        self.handler = FieldLineHandler(os.path.join(self.path, 'fs_info.sav'), 'EIM')
+        self.handler.update_read_parameters(surfaces=(2, 4, 6))
+        with ThreadPoolExecutor(1, thread_name_prefix='surfaces') as executor, \
+                mock.patch.object(flh, 'open_surface_quantities', record_thread):
+            self.assertEqual(len(asyncio.run(collect_in(executor))), 3)
+        self.assertEqual(len(threads), 3)
+        self.assertTrue(all(name.startswith('surfaces') for name in threads))
+
+    def test_parallel_read(self):
+        """
+        Reading with a pool of workers should give the same bytes as the
+        sequential read. Threads are used so that the patched readsav is seen
+        by the workers.
+        """
+        self.handler.update_read_parameters(surfaces=':', lines='1:9:2',
+                                            direction='both')
+        self.handler.load_data(getB=True)
+        field_lines = self.handler.return_field_lines()
+        B = self.handler.return_B()
+        self.handler.drop_data()
+        self.handler.load_data(getB=True, workers=3, pool='thread')
+        self.assertEqual(field_lines.tobytes(),
+                         self.handler.return_field_lines().tobytes())
+        self.assertEqual(B.tobytes(), self.handler.return_B().tobytes())
+        self.handler.drop_data()
+        self.assertRaises(ValueError, self.handler.load_data, workers=2, pool='retek')
+
+    def test_lazy_view(self):
+        """
+        Indexing the lazy view should give the same data as indexing the
+        loaded array. Only the indexed surfaces should be read.
+        """
+        self.handler.update_read_parameters(surfaces=(2, 4, 6), lines='1:9:2',
+                                            tor_range='-1:-30:-3', direction='both')
+        lazy = self.handler.return_field_lines(lazy=True)
+        self.handler.load_data()
+        field_lines = self.handler.return_field_lines()
+        self.assertEqual(lazy.shape, field_lines.shape)
+        for key in (Ellipsis, 1, (slice(None), 2), (0, slice(1, 3), -1),
+                    (Ellipsis, 1), (slice(None), [0, 3], 2), 
+                    (Ellipsis, [True, False, True])):
+            self.assertTrue(np.array_equal(lazy[key], field_lines[key]))
+        #index arrays are applied to each axis independently
+        self.assertTrue(np.array_equal(lazy[[0, 2], :, [1, 3]], 
+                                       field_lines[[0, 2]][:, :, [1, 3]]))
+        self.assertTrue(np.array_equal(np.asarray(lazy), field_lines))
+        with mock.patch.object(sc, 'readsav', wraps=fake_readsav) as readsav:
+            lazy[..., 1]
+        self.assertEqual(readsav.call_count, 1)
+        self.assertRaises(IndexError, lazy.__getitem__, (0, 0, 0, 0, 0))
+        #the shape and type are known from the load, views read nothing
+        with mock.patch.object(flh, 'decode_surface_file') as decode:
+            for i in range(3):
+                self.handler.return_field_lines(lazy=True)
+        decode.assert_not_called()
+        other = FieldLineHandler(os.path.join(self.path, 'fs_info.sav'), 'EIM')
+        other.update_read_parameters(surfaces=(2, 4))
+        with mock.patch.object(flh, 'decode_surface_file', 
+                               wraps=flh.decode_surface_file) as decode:
+            other.return_field_lines(lazy=True)
+            other.return_B(lazy=True)
+        self.assertEqual(decode.call_count, 1)
+
+    def test_memory_cache_retention(self):
+        """
+        Only eager loads in this process should fill the memory cache: lazy 
+        views keep nothing and worker processes start with no budget.
+        """
+        self.memory_cache.set_budget(2**30)
+        self.handler.update_read_parameters(surfaces=(2, 4, 6), direction='both')
+        lazy = self.handler.return_field_lines(lazy=True)
+        lazy[..., 1]
+        np.asarray(lazy)
+        self.assertEqual(len(self.memory_cache), 0)
+        self.handler.load_data()
+        self.assertEqual(len(self.memory_cache), 3)
+
+        self.handler.update_read_parameters(surfaces=(8, 10, 12), direction='both')
+        with mock.patch.object(flh, 'ProcessPoolExecutor', 
+                               wraps=flh.ThreadPoolExecutor) as executor:
+            self.handler.load_data(workers=2)
+            list(self.handler.iter_surfaces(pool='process'))
+        self.assertEqual(executor.call_count, 2)
+        for call in executor.call_args_list:
+            self.assertIs(call.kwargs['initializer'], flh.disable_shared_cache)
+        #the stand-in pool ran the initializer in this process
+        self.assertEqual(self.memory_cache.max_bytes, 0)
+
+
+class TestProcessPool(unittest.TestCase):
+    """
+    Reading synthetic save files in worker processes, which need the read 
+    functions and their results to be pickled.
+    """
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.fs_info = write_configuration(self.tmp.name, surfaces=range(5),
+                                           lines=8, tor=20)
+
+    def test_process_pool(self):
+        handler = FieldLineHandler(self.fs_info, 'EIM')
+        handler.update_read_parameters(lines='1:8:2', tor_range='3:35', 
+                                       direction='both')
+        handler.load_data(getB=True)
+        field_lines = handler.return_field_lines()
+        B = handler.return_B()
+        handler.drop_data()
+        handler.load_data(getB=True, workers=2, pool='process')
+        self.assertEqual(field_lines.tobytes(), handler.return_field_lines().tobytes())
+        self.assertEqual(B.tobytes(), handler.return_B().tobytes())
+        items = list(handler.iter_surfaces(getB=True, workers=2, pool='process'))
+        self.assertEqual([item[0] for item in items], list(range(5)))
+        for i, (surface, lines, b, gradB) in enumerate(items):
+            self.assertTrue(np.array_equal(lines, field_lines[..., i]))
+            self.assertTrue(np.array_equal(b, B[..., i]))
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
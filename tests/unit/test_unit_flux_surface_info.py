@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from scipy.io import readsav
+
+import flap_field_lines.flux_surface_info as fsi
+from flap_field_lines.flux_surface_info import FluxSurfaceInfo, read_fs_info
+from flap_field_lines.field_line_handler import FieldLineHandler
+
+from ..synthetic_data import write_configuration
+
+class TestFluxSurfaceInfo(unittest.TestCase):
+    """
+    Lookups on a small hand-made configuration: surfaces 0-5 are the main 
+    plasma with separatrix 4, surfaces 6-8 are an island with separatrix 7.
+    """
+
+    def setUp(self) -> None:
+        self.info = FluxSurfaceInfo(
+            iota=[0.9, 0.92, 0.95, 0.97, 1.0, 1.02, 1.1, 1.2, 1.3], 
+            reff=[0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.05, 0.15, 0.25], 
+            separatrix=[4, 7], names=np.array([b'x', b'island'], dtype=object), 
+            flags=[0, 0, 0, 0, 0, 0, 1, 1, 1])
+
+    def test_read_only(self):
+        self.assertEqual(len(self.info), 9)
+        self.assertEqual(list(self.info.names), [b'main plasma', b'island'])
+        self.assertIs(self.info['reff'], self.info.reff)
+        with self.assertRaises(ValueError):
+            self.info.reff[0] = 1
+        with self.assertRaises(AttributeError):
+            self.info.reff = None
+
+    def test_lookups(self):
+        self.assertEqual(list(np.nonzero(self.info.island_mask('island'))[0]), [6, 7, 8])
+        self.assertEqual(list(self.info.sorted_surfaces()), [6, 0, 7, 1, 8, 2, 3, 4, 5])
+        self.assertEqual(list(self.info.inside_separatrix()), [0, 1, 2, 3, 4])
+        self.assertEqual(list(self.info.inside_separatrix('island')), [6, 7])
+        self.assertEqual(list(self.info.surfaces_within(0.2)), [6, 0, 7, 1])
+        self.assertEqual(list(self.info.surfaces_within(0.2, island=0)), [0, 1])
+        self.assertEqual(self.info.iota_surface(0.96), 2)
+        self.assertEqual(self.info.iota_surface(2), 5)
+        self.assertEqual(self.info.iota_surface(0, island=1), 6)
+        self.assertEqual(list(self.info.iota_range(0.95, 1.1)), [2, 3, 4, 5, 6])
+        self.assertRaises(ValueError, self.info.island, 'retek')
+
+class TestReadFsInfo(unittest.TestCase):
+    """
+    Reads a synthetic fs_info.sav once and shares it between handlers.
+    """
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.file = write_configuration(self.tmp.name, surfaces=range(3), 
+                                        lines=4, tor=10)
+
+    def test_read_fs_info(self):
+        info = read_fs_info(self.file)
+        record = readsav(self.file)['fs_info'][0]
+        for name, i in fsi.FIELDS.items():
+            if name != 'names':
+                self.assertTrue(np.array_equal(info[name], record[i]))
+        self.assertEqual(list(info.names), [b'main plasma', b'island_1'])
+
+        with mock.patch.object(fsi, 'decode_fs_info', 
+                               side_effect=AssertionError) as decode:
+            handler = FieldLineHandler(self.file, 'EIM')
+            other = FieldLineHandler(self.file, 'EIM')
+        self.assertIs(handler.return_fs_info(), info)
+        self.assertIs(other.return_fs_info(), info)
+
+        stat = os.stat(self.file)
+        os.utime(self.file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertIsNot(read_fs_info(self.file), info)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -6,12 +6,18 @@ Created on Tue May 25 2021
 """
 
 from os import XATTR_REPLACE
+import os
+import tempfile
 import unittest
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from numpy.lib.scimath import sqrt
 
 from flap_field_lines.image_projector import *
 
+from .test_unit_field_line_handler import SyntheticSurfaces
+from ..synthetic_data import surface_tags
+
 class TestAccessories(unittest.TestCase):
     """
     This class tests two helper functions of the ImageProjector class.
@@ -355,5 +361,230 @@ class TestProjectionUpdate(unittest.TestCase):
         
 
 
+class TestCalcPixelCoord(unittest.TestCase):
+    """
+    Tests the fused projection of calc_pixel_coord on inputs of various 
+    shapes.
+    """
+    def setUp(self):
+        self.view = ImageProjector.from_file('aeq31', '20160218', 'edicam')
+        rng = np.random.default_rng(0)
+        #points in front of the camera
+        self.points = rng.uniform(5, 6, (3, 4, 5, 6, 2))
+
+    def reference(self, points):
+        matrix, offset = self.view.view_parameters()
+        flat = self.view.project_points(points.reshape(3, -1))
+        return (matrix @ flat + offset).reshape((2,) + points.shape[1:])
+
+    def test_shapes(self):
+        for points in (self.points[:, 0, 0, 0, 0], self.points[..., 0, 0, 0], 
+                       self.points[..., 0], self.points):
+            pixels = self.view.calc_pixel_coord(points)
+            self.assertEqual(pixels.shape, (2,) + points.shape[1:])
+            self.assertTrue(np.allclose(pixels, self.reference(points)))
+        self.assertRaises(ValueError, self.view.calc_pixel_coord, np.zeros((2, 5)))
+
+    def test_out_and_chunks(self):
+        expected = self.view.calc_pixel_coord(self.points)
+        out = np.empty((2, 2) + self.points.shape[1:])
+        result = project_to_pixels(self.points, *self.view.projection_kernel(), 
+                                   out=out[1], chunk_size=7)
+        self.assertTrue(np.shares_memory(result, out))
+        self.assertTrue(np.allclose(out[1], expected))
+        #an output that can not be reshaped without a copy
+        out = np.empty((2, 2, 6, 5, 4)).transpose(0, 4, 3, 2, 1)
+        project_to_pixels(self.points, *self.view.projection_kernel(), out=out)
+        self.assertTrue(np.allclose(out, expected))
+        self.assertRaises(ValueError, self.view.calc_pixel_coord, self.points, 
+                          np.empty((2, 3)))
+
+    def test_threads(self):
+        """
+        Concurrent calls with inputs of different dimensions should not 
+        interfere.
+        """
+        inputs = [self.points[..., 0, 0], self.points] * 8
+        expected = [self.view.calc_pixel_coord(points) for points in inputs]
+        matrix, offset = self.view.view_parameters()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(self.view.calc_pixel_coord, inputs))
+        for result, reference in zip(results, expected):
+            self.assertTrue(np.array_equal(result, reference))
+        self.assertTrue(np.array_equal(self.view.view_parameters()[1], offset))
+
+    def test_float32_error_bound(self):
+        """
+        Field lines stored and projected in float32 should be within 0.01 
+        pixel of the float64 projection inside a 1280x1024 image, in all 
+        views with that image size.
+        """
+        tags = surface_tags(60, lines=60)
+        points = np.array([tags['xf'], tags['yf'], tags['zf']])
+        for view, shot, cam in (('aeq20', '20160308', 'edicam'), 
+                                ('aeq31', '20160218', 'edicam'), 
+                                ('aeq41', '20160308', 'edicam'), 
+                                ('aeq50', '20160308', 'edicam')):
+            view = ImageProjector.from_file(view, shot, cam)
+            expected = view.calc_pixel_coord(points)
+            pixels = view.calc_pixel_coord(points.astype(np.float32), 
+                                           dtype=np.float32)
+            self.assertEqual(pixels.dtype, np.float32)
+            inside = view.cull(points)
+            self.assertGreater(inside.sum(), 1000)
+            self.assertLess(np.abs(pixels - expected)[:, inside].max(), 0.01)
+
+    def test_cull(self):
+        """
+        Points behind the camera and outside the image should be dropped, 
+        the rest should be projected as by calc_pixel_coord.
+        """
+        tags = surface_tags(60, lines=30, tor=400)
+        points = np.array([tags['xf'], tags['yf'], tags['zf']])
+        expected = self.view.calc_pixel_coord(points)
+        inside = ((expected[0] > -0.5) & (expected[0] < 1023.5) & 
+                  (expected[1] > -0.5) & (expected[1] < 1279.5))
+        self.assertGreater(inside.sum(), 100)
+        self.assertLess(inside.sum(), inside.size)
+
+        pixels, indices = self.view.visible_pixel_coord(points)
+        visible = self.view.cull(points)
+        self.assertTrue(np.array_equal(visible, inside))
+        self.assertTrue(np.array_equal(np.nonzero(inside), indices))
+        self.assertTrue(np.allclose(pixels, expected[:, inside]))
+        masked = self.view.visible_pixel_coord(points, masked=True)
+        self.assertTrue(np.array_equal(masked.mask[0], ~inside))
+        self.assertTrue(np.allclose(masked[:, inside], expected[:, inside]))
+        self.assertGreater(self.view.cull(points, margin=100).sum(), inside.sum())
+
+        #points mirrored to the camera project to the same pixels
+        camera = rzt_2_xyz(6.44669, 2.54492, 0.665888)[:, :, np.newaxis]
+        behind = 2 * camera - points
+        self.assertTrue(np.allclose(self.view.calc_pixel_coord(behind), expected))
+        self.assertFalse(self.view.cull(behind).any())
+
+class TestMultiViewProjector(unittest.TestCase):
+    """
+    Compares the batch projection of several views with the projections of 
+    the views one by one.
+    """
+    def setUp(self):
+        self.selection = [('aeq20', '20160308', 'edicam'), 
+                          ('aeq21', '20160217', 'phot'), 
+                          ('aeq31', '20160218', 'edicam'), 
+                          ('aea21', '20221207', 'phot')]
+        rng = np.random.default_rng(0)
+        self.points = rng.uniform(5, 6, (3, 7, 11, 2))
+
+    def test_calc_pixel_coord(self):
+        views = MultiViewProjector.from_file(self.selection, chunk_size=10)
+        self.assertEqual(len(views), 4)
+        pixels = views.calc_pixel_coord(self.points)
+        self.assertEqual(pixels.shape, (4, 2, 7, 11, 2))
+        for i, (view, shot, cam) in enumerate(self.selection):
+            expected = ImageProjector.from_file(view, shot, cam).calc_pixel_coord(self.points)
+            self.assertTrue(np.allclose(pixels[i], expected))
+        out = np.empty_like(pixels)
+        views.calc_pixel_coord(self.points, out=out)
+        self.assertTrue(np.array_equal(out, pixels))
+        transposed = MultiViewProjector.from_file(self.selection[1:2], True)
+        self.assertTrue(np.array_equal(transposed.calc_pixel_coord(self.points)[0], 
+                                       pixels[1, ::-1]))
+        self.assertRaises(ValueError, MultiViewProjector, [])
+
+class TestViewRegistry(unittest.TestCase):
+    """
+    Tests the parsed views file against the projectors it creates.
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.file = os.path.join(self.tmp.name, 'views2.txt')
+        with open(VIEWS_FILE) as src, open(self.file, 'w') as dest:
+            dest.write(src.read())
+
+    def test_lists(self):
+        registry = view_registry(self.file)
+        self.assertEqual(registry.list_views()[:3], 
+                         ['W7X-AEQ20', 'W7X-AEQ21', 'W7X-AEQ31'])
+        self.assertEqual(registry.list_shots('aeq20'), ['20160308', '20160308deg90'])
+        self.assertEqual(registry.list_cams('aeq21', '20160217'), ['phot'])
+        self.assertEqual(registry.parameters('aeq20', '20160308', 'edicam'), 
+                         {'R0': 6.34811, 'theta0': 1.21099, 'z0': -0.649178, 
+                          'Rp': 6.21, 'thetap': -0.04, 'zp': 0.81, 'enh': 1.63, 
+                          'alpha': 3.14, 'xoff': -2.51, 'yoff': 8.25, 
+                          'imsize': [1280, 1024]})
+        self.assertRaises(ValueError, registry.list_shots, 'aeq99')
+        self.assertRaises(ValueError, registry.get, 'aeq20', '20160308', 'phot')
+
+    def test_projectors(self):
+        registry = view_registry(self.file)
+        projectors = registry.all_projectors()
+        self.assertEqual(len(projectors), 28)
+        points = np.random.default_rng(0).uniform(5, 6, (3, 10))
+        view = ImageProjector.from_file('aeq31', '20160218', 'edicam', file=self.file)
+        self.assertEqual(str(view), 'W7X-AEQ31, 20160218, edicam')
+        self.assertTrue(np.array_equal(
+            view.calc_pixel_coord(points), 
+            projectors[('W7X-AEQ31', '20160218', 'edicam')].calc_pixel_coord(points)))
+
+    def test_cache(self):
+        registry = view_registry(self.file)
+        self.assertIs(view_registry(self.file), registry)
+        with open(self.file, 'a') as f:
+            f.write('W7X-AEQ20\nshot: 1\ncam: test\n'
+                    'struct={R0:6, z0:0, theta0:1, Rp:6, zp:1, thetap:0, l0:1, '
+                    'gamma:0, xoffset:0, yoffset:0, half: -1, xmirror: 0, '
+                    'ymirror: 0, imsize: [10,20]}\n@\n#\n!!!\n')
+        stat = os.stat(self.file)
+        os.utime(self.file, ns=(stat.st_atime_ns, registry.mtime_ns + 10**9))
+        updated = view_registry(self.file)
+        self.assertIsNot(updated, registry)
+        self.assertEqual(updated.parameters('aeq20', '1', 'test')['imsize'], [10, 20])
+
+class TestStreamingProjection(SyntheticSurfaces):
+    """
+    Chunked projection of memory-mapped arrays and field line handlers.
+    """
+    def setUp(self):
+        super().setUp()
+        self.view = ImageProjector.from_file('aeq31', '20160218', 'edicam')
+        rng = np.random.default_rng(0)
+        self.points = rng.uniform(5, 6, (3, 6, 10, 3))
+
+    def test_memmap_to_file(self):
+        source = os.path.join(self.path, 'points.npy')
+        np.save(source, self.points)
+        source = np.load(source, mmap_mode='r')
+        output = os.path.join(self.path, 'pixels.npy')
+        out = project_stream(self.view, source, output, chunk=2, dtype=np.float32)
+        expected = self.view.calc_pixel_coord(self.points)
+        self.assertEqual(out.dtype, np.float32)
+        self.assertTrue(np.allclose(np.load(output), expected, rtol=1e-6))
+
+        #arrays are chunked along the line axis by default
+        keys = []
+        out = project_stream(self.view, source, np.empty((2, 6, 10, 3)), 
+                             sink=lambda key, pixels: keys.append(key))
+        self.assertTrue(np.allclose(out, expected))
+        self.assertEqual(keys[1], (slice(None), slice(1, 2)))
+        self.assertEqual(len(keys), 6)
+        self.assertRaises(ValueError, list, iter_pixel_coord(self.view, source, 
+                                                             axis=0))
+
+    def test_handler_to_views(self):
+        self.handler.update_read_parameters(surfaces=(2, 4, 6), lines='0:8', 
+                                            tor_range='0:30')
+        views = MultiViewProjector.from_file([('aeq31', '20160218', 'edicam'), 
+                                              ('aeq20', '20160308', 'edicam')])
+        chunks = list(iter_pixel_coord(views, self.handler, chunk=2))
+        self.assertEqual([key[-1] for key, pixels in chunks], 
+                         [slice(0, 2), slice(2, 4)])
+        self.handler.load_data()
+        expected = views.calc_pixel_coord(self.handler.return_field_lines())
+        out = project_stream(views, self.handler, os.path.join(self.path, 'v.npy'))
+        self.assertEqual(out.shape, (2, 2, 8, 30, 3))
+        self.assertTrue(np.allclose(out, expected))
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+
+import flap_field_lines
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(flap_field_lines.__file__)))
+
+#modules that only plotting and readsav fallbacks need
+HEAVY_MODULES = ['matplotlib', 'scipy.io', 'scipy.ndimage', 'asyncio']
+
+def imported_modules(statement, modules):
+    """
+    Returns which of 'modules' are imported by 'statement' in a new 
+    interpreter.
+    """
+    code = f'{statement}; import sys; print(*[m for m in {modules!r} if m in sys.modules])'
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    result = subprocess.run([sys.executable, '-c', code], env=env, check=True, 
+                            capture_output=True, text=True)
+    return result.stdout.split()
+
+class TestImport(unittest.TestCase):
+
+    def test_package(self):
+        self.assertEqual(imported_modules('import flap_field_lines', 
+                                          ['numpy', 'flap_field_lines.field_line_handler']), 
+                         [])
+
+    def test_core_modules(self):
+        self.assertEqual(imported_modules('import flap_field_lines.field_line_handler, '
+                                          'flap_field_lines.image_projector', 
+                                          HEAVY_MODULES), 
+                         [])
+
+    def test_aliases(self):
+        import flap_field_lines.field_line_handler as flh
+        self.assertIs(flap_field_lines.flh, flh)
+        self.assertIn('imp', dir(flap_field_lines))
+        with self.assertRaises(AttributeError):
+            flap_field_lines.missing
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+"""
+
+import os
+import tempfile
+import tracemalloc
+import unittest
+from unittest import mock
+
+import flap_field_lines.field_line_handler as flh
+import flap_field_lines.instrumentation as ins
+import flap_field_lines.sav_reader as sr
+import flap_field_lines.surface_cache as sc
+from flap_field_lines.field_line_handler import FieldLineHandler
+from flap_field_lines.instrumentation import add_callback, instrument, remove_callback, stage
+from flap_field_lines.image_projector import ImageProjector
+
+from ..synthetic_data import write_configuration
+from .test_unit_field_line_handler import SyntheticSurfaces
+
+class TestInstrumentation(SyntheticSurfaces):
+    """
+    Measures loading and projecting the synthetic surfaces.
+    """
+
+    def test_disabled(self):
+        self.assertIs(stage('load_data'), ins.NULL_STAGE)
+        with instrument():
+            self.assertIsNot(stage('load_data'), ins.NULL_STAGE)
+        self.assertIs(stage('load_data'), ins.NULL_STAGE)
+
+    def test_stats(self):
+        self.handler.update_read_parameters(surfaces=(2, 4, 6), direction='both')
+        view = ImageProjector.from_file('aeq31', '20160218', 'edicam')
+        with instrument() as stats:
+            self.handler.load_data(getB=True)
+            view.calc_pixel_coord(self.handler.return_field_lines())
+        self.assertEqual(stats['load_data']['calls'], 1)
+        self.assertEqual(stats['read_surface']['calls'], 3)
+        #one decode per surface
+        self.assertEqual(stats['decode']['calls'], 3)
+        self.assertEqual(stats['extract']['calls'], 6)
+        field_lines = self.handler.return_field_lines()
+        self.assertEqual(stats['allocate']['bytes_allocated'], 2 * field_lines.nbytes)
+        self.assertEqual(stats['calc_pixel_coord']['bytes_allocated'], 
+                         field_lines.nbytes * 2 // 3)
+        self.assertIsNone(stats['load_data']['peak_memory'])
+        files = [event['file'] for event in stats.events 
+                 if event['stage'] == 'read_surface']
+        self.assertEqual(files, self.handler.return_surface_files())
+        self.assertGreaterEqual(stats['load_data']['time'], 
+                                stats['read_surface']['time'])
+        self.assertIn('read_surface', str(stats))
+
+    def test_callback_and_memory(self):
+        events = []
+        add_callback(events.append)
+        try:
+            with instrument(trace_memory=True, events=False) as stats:
+                self.handler.update_read_parameters(surfaces=(2, 4))
+                self.handler.load_data()
+        finally:
+            remove_callback(events.append)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertIsNone(stats.events)
+        self.assertEqual([event['stage'] for event in events].count('read_surface'), 2)
+        nbytes = self.handler.return_field_lines().nbytes
+        self.assertGreaterEqual(stats['allocate']['peak_memory'], nbytes)
+        self.assertGreaterEqual(stats['load_data']['peak_memory'], nbytes)
+        self.assertTrue(all(event['peak_memory'] is not None for event in events))
+        #nothing is measured after the callback is removed
+        count = len(events)
+        self.handler.load_data(getB=True)
+        self.assertEqual(len(events), count)
+
+class TestBytesRead(unittest.TestCase):
+    """
+    The bytes read by each reading path on synthetic save files.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patcher = mock.patch.object(flh, 'shared_cache', 
+                                    sc.SurfaceMemoryCache(max_bytes=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def handler(self, compress, cache_dir=None):
+        path = os.path.join(self.tmp.name, str(compress))
+        handler = FieldLineHandler(write_configuration(path, surfaces=range(3), 
+                                                       lines=8, tor=20, 
+                                                       compress=compress), 
+                                   'EIM', cache_dir)
+        handler.update_read_parameters(surfaces=':')
+        return handler
+
+    def test_selective_reader(self):
+        #forward field lines are the first quantity, the rest of uncompressed 
+        #files is not read, compressed records are read in 1 MiB chunks
+        for compress in (False, True):
+            handler = self.handler(compress)
+            with instrument() as stats:
+                handler.load_data()
+            size = sum(os.path.getsize(file) 
+                       for file in handler.return_surface_files())
+            bytes_read = stats['decode']['bytes_read']
+            if compress:
+                self.assertGreater(bytes_read, 0)
+                self.assertLessEqual(bytes_read, size)
+            else:
+                self.assertGreaterEqual(bytes_read, 
+                                        handler.return_field_lines().nbytes)
+                self.assertLess(bytes_read, size / 2)
+
+    def test_cache_files(self):
+        cache_dir = os.path.join(self.tmp.name, 'cache')
+        handler = self.handler(False, cache_dir)
+        sc.convert_surface_files(handler.return_surface_files(), cache_dir)
+        handler.update_read_parameters(lines='0:8:2', tor_range='0:10')
+        with instrument() as stats:
+            handler.load_data()
+        self.assertNotIn('decode', stats.stages)
+        self.assertEqual(stats['extract']['bytes_read'], 
+                         handler.return_field_lines().nbytes)
+
+    def test_readsav(self):
+        file = self.handler(True).return_surface_files()[0]
+        with instrument() as stats:
+            with stage('decode'):
+                sr.readsav(file)
+        self.assertEqual(stats['decode']['bytes_read'], os.path.getsize(file))
+        #nothing is recorded outside of stages
+        ins.record(bytes_read=1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
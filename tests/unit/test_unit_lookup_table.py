@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+"""
+
+import os
+import unittest
+import numpy as np
+
+from unittest import mock
+
+from flap_field_lines.image_projector import ImageProjector
+from flap_field_lines.rasterizer import rasterize
+import flap_field_lines.field_line_handler as flh
+import flap_field_lines.lookup_table as lut
+
+from .test_unit_field_line_handler import SyntheticSurfaces
+
+class TestPixelLookupTable(SyntheticSurfaces):
+    def setUp(self):
+        super().setUp()
+        self.view = ImageProjector(R0=8, theta0=0.1, z0=0.5, Rp=0.2, 
+                                   thetap=np.pi, zp=0, enh=0.3)
+        self.handler.update_read_parameters(surfaces=(2, 4, 6))
+
+    def test_build_and_reuse(self):
+        with mock.patch.object(lut, 'rasterize', wraps=rasterize) as counter:
+            table = lut.pixel_lookup_table(self.view, self.handler)
+            again = lut.pixel_lookup_table(self.view, self.handler)
+        self.assertEqual(counter.call_count, 1)
+        self.assertIsInstance(again['surface'], np.memmap)
+        self.assertTrue(os.path.isdir(os.path.join(self.path, 'lookup_tables')))
+        maps = rasterize(self.view, self.handler, values=['reff'])
+        for name in ('hits', 'surface', 'depth', 'reff'):
+            self.assertTrue(np.array_equal(again[name], maps[name], 
+                                           equal_nan=name == 'reff'))
+            self.assertTrue(np.array_equal(table[name], maps[name], 
+                                           equal_nan=name == 'reff'))
+
+    def test_key(self):
+        key = lut.table_key(self.view, self.handler)
+        self.assertEqual(key, lut.table_key(self.view, self.handler))
+        other = ImageProjector(R0=8, theta0=0.1, z0=0.5, Rp=0.2, 
+                               thetap=np.pi, zp=0, enh=0.35)
+        self.assertNotEqual(key, lut.table_key(other, self.handler))
+        self.assertNotEqual(key, lut.table_key(self.view, self.handler, ['reff']))
+        file = self.handler.return_surface_files()[0]
+        stat = os.stat(file)
+        os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertNotEqual(key, lut.table_key(self.view, self.handler))
+        self.handler.update_read_parameters(surfaces=(2, 4))
+        self.assertNotEqual(key, lut.table_key(self.view, self.handler))
+        self.handler.update_read_parameters(surfaces=(2, 4), lines='0:5')
+        self.assertNotEqual(key, lut.table_key(self.view, self.handler))
+
+    def test_hit_reads_no_surface(self):
+        """
+        The key should not depend on whether the default selection was 
+        resolved, and a table hit should decode no surface file.
+        """
+        key = lut.table_key(self.view, self.handler)
+        lut.pixel_lookup_table(self.view, self.handler)
+        self.assertIsNotNone(self.handler.lines)
+        self.assertEqual(key, lut.table_key(self.view, self.handler))
+        with mock.patch.object(lut, 'rasterize') as build, \
+                mock.patch.object(flh, 'decode_surface_file') as decode:
+            lut.pixel_lookup_table(self.view, self.handler)
+        build.assert_not_called()
+        decode.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
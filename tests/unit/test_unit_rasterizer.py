@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+"""
+
+import unittest
+import numpy as np
+
+from flap_field_lines.image_projector import ImageProjector
+from flap_field_lines.rasterizer import *
+
+from ..synthetic_data import surface_tags
+from .test_unit_field_line_handler import SyntheticSurfaces
+
+class TestSampling(unittest.TestCase):
+    """
+    Tests segment sampling and the nearest sample selection on pixel 
+    coordinates given directly.
+    """
+    def test_sample_segments(self):
+        #one line from (0, 2) to (6, 2) and on to (6, 5), depth 1 then 2
+        pixels = np.array([[0, 6, 6], [2, 2, 5]], dtype=float).reshape(2, 1, 3, 1)
+        depth = np.array([1., 1., 2.]).reshape(1, 3, 1)
+        index = np.zeros((1, 3, 1), dtype=int)
+        flat, sample_depth, sample_index = sample_segments(pixels, depth, index, 
+                                                           (8, 10), 100)
+        self.assertEqual(list(flat), [20, 21, 22, 23, 24, 25, 26, 36, 46])
+        self.assertTrue(np.allclose(sample_depth[:7], 1))
+        #inverse depth is interpolated
+        self.assertTrue(np.allclose(sample_depth[7:], [1.2, 1.5]))
+        self.assertFalse(sample_index.any())
+
+        #segments behind the camera or out of the image are dropped
+        depth[0, 2, 0] = -1
+        flat, sample_depth, sample_index = sample_segments(pixels - [[[[20]]], [[[0]]]], 
+                                                           depth, index, (8, 10), 100)
+        self.assertEqual(len(flat), 0)
+
+    def test_update_nearest(self):
+        depth = np.array([np.inf, 2, 2])
+        nearest = np.array([-1, 5, 5])
+        update_nearest(depth, nearest, np.array([0, 2, 0, 1, 2]), 
+                       np.array([3., 1, 1, 4, 3]), np.array([0, 1, 2, 3, 4]))
+        self.assertEqual(list(depth), [1, 2, 1])
+        self.assertEqual(list(nearest), [2, 5, 1])
+
+class TestRasterize(unittest.TestCase):
+    """
+    Rasterizes synthetic surfaces and compares with the projected points.
+    """
+    def setUp(self):
+        self.view = ImageProjector.from_file('aeq31', '20160218', 'edicam')
+        self.points = np.stack([np.array([tags['xf'], tags['yf'], tags['zf']]) 
+                                for tags in (surface_tags(number, 40, 400) 
+                                             for number in (20, 60))], axis=-1)
+
+    def test_rasterize(self):
+        maps = rasterize(self.view, self.points, surfaces=[20, 60], 
+                         values={'reff': np.array([0.15, 0.35])}, chunk=1)
+        self.assertEqual(maps['hits'].shape, (1280, 1024))
+        hit = maps['hits'] > 0
+        self.assertGreater(hit.sum(), 1000)
+        self.assertTrue(np.array_equal(hit, maps['surface'] >= 0))
+        self.assertTrue(np.array_equal(hit, np.isfinite(maps['depth'])))
+        self.assertTrue(np.array_equal(maps['reff'][hit] == 0.15, 
+                                       maps['surface'][hit] == 20))
+        self.assertTrue(np.isnan(maps['reff'][~hit]).all())
+
+        #every visible point is sampled, as the start of a segment
+        pixels = self.view.calc_pixel_coord(self.points[:, :, :-1])
+        column = np.rint(pixels[0]).astype(int)
+        row = np.rint(pixels[1]).astype(int)
+        inside = (column >= 0) & (column < 1024) & (row >= 0) & (row < 1280)
+        inside &= self.view.calc_depth(self.points[:, :, :-1]) > 0
+        self.assertTrue(hit[row[inside], column[inside]].all())
+        #the same maps are made in one chunk
+        other = rasterize(self.view, self.points, chunk=2)
+        self.assertTrue(np.array_equal(other['hits'], maps['hits']))
+        self.assertTrue(np.array_equal(other['depth'], maps['depth']))
+        labels = np.array([-1, 20, 60])[other['surface'] + 1]
+        self.assertTrue(np.array_equal(labels, maps['surface']))
+
+    def test_zbuffer(self):
+        depth, nearest = zbuffer(self.view, self.points, chunk_size=5000)
+        points = self.points.reshape(3, -1)
+        pixels = self.view.calc_pixel_coord(points)
+        distance = self.view.calc_depth(points)
+        column = np.rint(pixels[0]).astype(int)
+        row = np.rint(pixels[1]).astype(int)
+        inside = (column >= 0) & (column < 1024) & (row >= 0) & (row < 1280)
+        inside &= distance > 0
+        self.assertGreater(inside.sum(), 1000)
+        #reference z-buffer with np.minimum.at
+        reference = np.full((1280, 1024), np.inf)
+        np.minimum.at(reference, (row[inside], column[inside]), distance[inside])
+        self.assertTrue(np.array_equal(depth, reference))
+        hit = nearest >= 0
+        self.assertTrue(np.array_equal(hit, np.isfinite(depth)))
+        self.assertTrue(np.array_equal(distance[nearest[hit]], depth[hit]))
+        self.assertTrue(np.array_equal(row[nearest[hit]], np.nonzero(hit)[0]))
+
+        #the points mode of rasterize() is the same z-buffer
+        maps = rasterize(self.view, self.points, mode='points')
+        self.assertTrue(np.array_equal(maps['depth'], depth))
+        self.assertTrue(np.array_equal(maps['surface'][hit], nearest[hit] % 2))
+        with self.assertRaises(ValueError):
+            rasterize(self.view, self.points, mode='lines')
+
+    def test_project_points_depth(self):
+        projected, depth = self.view.project_points(self.points, return_depth=True)
+        self.assertTrue(np.allclose(projected, self.view.project_points(self.points)))
+        self.assertTrue(np.allclose(depth, self.view.calc_depth(self.points)))
+
+class TestRasterizeHandler(SyntheticSurfaces):
+    def test_rasterize_handler(self):
+        #a camera looking at the fake surfaces around the origin
+        view = ImageProjector(R0=8, theta0=0.1, z0=0.5, Rp=0.2, thetap=np.pi, 
+                              zp=0, enh=0.3)
+        self.handler.update_read_parameters(surfaces=(2, 4, 6))
+        maps = rasterize(view, self.handler, values=['reff'])
+        reff = self.handler.return_fs_info()['reff']
+        hit = maps['surface'] >= 0
+        self.assertGreater(hit.sum(), 100)
+        self.assertTrue(set(maps['surface'][hit]) <= {2, 4, 6})
+        self.assertTrue(np.array_equal(maps['reff'][hit], reff[maps['surface'][hit]]))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
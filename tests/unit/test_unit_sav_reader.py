@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from scipy.io import readsav
+
+import flap_field_lines.surface_cache as sc
+from flap_field_lines.sav_reader import read_struct_fields
+from flap_field_lines.field_line_handler import FieldLineHandler
+from flap_field_lines.errors import SavFormatError
+
+from ..synthetic_data import write_sav, write_configuration, surface_tags
+
+def failing_readsav(file, *args, **kwargs):
+    raise AssertionError('readsav should not be called.')
+
+class TestReadStructFields(unittest.TestCase):
+    """
+    Compares the selective reader with readsav on synthetic save files.
+    """
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.file = os.path.join(self.tmp.name, 'surface.sav')
+
+    def check_fields(self, compress):
+        write_sav(self.file, 'surface', surface_tags(7, 6, 10), compress)
+        record = readsav(self.file)['surface'][0]
+        fields = [0, 2, 5, 9, 16, 21]
+        data = read_struct_fields(self.file, 'surface', fields)
+        self.assertEqual(sorted(data), fields)
+        for i in fields:
+            self.assertEqual(np.asarray(data[i]).dtype, np.asarray(record[i]).dtype)
+            self.assertTrue(np.array_equal(data[i], record[i]))
+
+    def test_uncompressed(self):
+        self.check_fields(False)
+
+    def test_compressed(self):
+        self.check_fields(True)
+
+    def test_errors(self):
+        write_sav(self.file, 'surface', surface_tags(7, 6, 10))
+        self.assertRaises(SavFormatError, read_struct_fields, self.file, 'fs_info', [3])
+        self.assertRaises(SavFormatError, read_struct_fields, self.file, 'surface', [40])
+        with open(self.file, 'w') as f:
+            f.write('retek')
+        self.assertRaises(SavFormatError, read_struct_fields, self.file, 'surface', [4])
+
+class TestSelectiveLoading(unittest.TestCase):
+    """
+    FieldLineHandler on a synthetic configuration should read surfaces 
+    without readsav and give the same data as readsav.
+    """
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.fs_info = write_configuration(self.tmp.name, surfaces=range(3),
+                                           lines=8, tor=20, compress=True)
+
+    def test_load_data(self):
+        handler = FieldLineHandler(self.fs_info, 'EIM')
+        handler.update_read_parameters(lines='0:8:3', direction='both')
+        with mock.patch.object(sc, 'readsav', failing_readsav):
+            handler.load_data(getGradB=True)
+        field_lines = handler.return_field_lines()
+        gradB = handler.return_gradB()
+        self.assertEqual(field_lines.shape, (3, 3, 40, 3))
+        for i, file in enumerate(handler.return_surface_files()):
+            record = readsav(file)['surface'][0]
+            fields = [np.array(record[j])[0:8:3] for j in range(4, 22)]
+            fields = [None] * 4 + fields
+            forward = np.array(fields[4:7])
+            backward = np.array(fields[7:10])[..., ::-1]
+            self.assertTrue(np.array_equal(field_lines[..., i], 
+                                           np.concatenate((backward, forward), axis=2)))
+            self.assertTrue(np.array_equal(gradB[:, :, 20:, i], 
+                                           np.array(fields[16:19])))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
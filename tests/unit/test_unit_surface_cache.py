@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+"""
+
+import io
+import os
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+import numpy as np
+
+import flap_field_lines.surface_cache as sc
+from flap_field_lines.field_line_handler import FieldLineHandler
+from .test_unit_field_line_handler import SyntheticSurfaces, SURF_FILE, fake_readsav
+
+def failing_readsav(file, *args, **kwargs):
+    raise AssertionError('readsav should not be called for cached surfaces.')
+
+class TestSurfaceCache(SyntheticSurfaces):
+    """
+    Tests of the .npy surface cache. Reuses the synthetic surface files of 
+    the FieldLineHandler loading tests.
+    """
+
+    def file(self, number):
+        return os.path.join(self.path, SURF_FILE % number)
+
+    def test_convert_surface_file(self):
+        cache_file = sc.convert_surface_file(self.file(4))
+        self.assertEqual(cache_file, self.file(4)[:-4] + '.npy')
+        record = sc.open_surface_file(self.file(4))
+        self.assertIsInstance(record, sc.CachedSurface)
+        self.assertIsInstance(record.data, np.memmap)
+        self.assertEqual(record.data.shape, (18, 12, 40))
+        for i in range(4, 22):
+            self.assertTrue(np.array_equal(record[i], 
+                                           fake_readsav(self.file(4))['surface'][0][i]))
+
+    def test_stale_cache_is_ignored(self):
+        cache_file = sc.convert_surface_file(self.file(4))
+        self.assertTrue(sc.is_cache_valid(self.file(4), cache_file))
+        stat = os.stat(cache_file)
+        os.utime(self.file(4), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertFalse(sc.is_cache_valid(self.file(4), cache_file))
+        self.assertNotIsInstance(sc.open_surface_file(self.file(4)), sc.CachedSurface)
+
+    def test_load_from_cache(self):
+        self.handler.update_read_parameters(surfaces=(2, 4, 6), lines=(1, 3, 5),
+                                            direction='both')
+        self.handler.load_data(getB=True, getGradB=True)
+        expected = [self.handler.return_field_lines(), self.handler.return_B(), 
+                    self.handler.return_gradB()]
+        cache_dir = os.path.join(self.path, 'cache')
+        files = [self.file(i) for i in (2, 4, 6)]
+        self.assertEqual(len(sc.convert_surface_files(files, cache_dir)), 3)
+        handler = FieldLineHandler(os.path.join(self.path, 'fs_info.sav'), 'EIM', 
+                                   cache_dir=cache_dir)
+        handler.update_read_parameters(surfaces=(2, 4, 6), lines=(1, 3, 5),
+                                       direction='both')
+        with mock.patch.object(sc, 'readsav', failing_readsav):
+            handler.load_data(getB=True, getGradB=True)
+        loaded = [handler.return_field_lines(), handler.return_B(), 
+                  handler.return_gradB()]
+        for a, b in zip(expected, loaded):
+            self.assertEqual(a.tobytes(), b.tobytes())
+
+    def test_command_line(self):
+        cache_dir = os.path.join(self.path, 'cache')
+        output = io.StringIO()
+        with redirect_stdout(output):
+            sc.main([self.path, '-c', cache_dir])
+        self.assertEqual(len(output.getvalue().split()), 10)
+        self.assertEqual(len(os.listdir(cache_dir)), 10)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
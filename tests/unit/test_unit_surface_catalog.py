@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: lordofbejgli
+"""
+
+import os
+import unittest
+from unittest import mock
+
+import flap_field_lines.surface_catalog as scat
+from flap_field_lines.surface_catalog import SurfaceCatalog, surface_catalog, surface_number
+
+from .test_unit_field_line_handler import SyntheticSurfaces
+
+SURF_FILE = 'field_lines_tor_ang_1.85_1turn_%s+252_w_o_limiters_w_o_torsion_w_characteristics_surf_%s.sav'
+
+class TestSurfaceCatalog(SyntheticSurfaces):
+    """
+    Catalogs the placeholder surface files of the synthetic configuration, 
+    with some more names added.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        for configuration, number in (('EIM', '7'), ('EIM', '1000'), 
+                                      ('EIM', '4'), ('FTM', '003')):
+            with open(os.path.join(self.path, SURF_FILE % (configuration, number)), 
+                      'w') as f:
+                f.write(number)
+        open(os.path.join(self.path, 'notes_surf_005.txt'), 'w').close()
+
+    def test_catalog(self):
+        catalog = SurfaceCatalog(self.path)
+        self.assertEqual(catalog.configurations(), ['EIM', 'FTM'])
+        self.assertEqual(catalog.surfaces('EIM'), sorted(list(range(0, 20, 2)) + [7, 1000]))
+        self.assertEqual(catalog.surfaces('FTM'), [3])
+        #the padded name of surface 4 is kept
+        self.assertEqual(catalog.entry('EIM', 4).name, SURF_FILE % ('EIM', '004'))
+        self.assertEqual(catalog.entry('EIM', 1000).size, 4)
+        self.assertIsNone(catalog.entry('EIM', 5))
+        files, numbers = catalog.files('EIM', [1000, 5, 7, 2])
+        self.assertEqual(numbers, [1000, 7, 2])
+        self.assertEqual(files[0], os.path.join(self.path, SURF_FILE % ('EIM', '1000')))
+        self.assertEqual([surface_number(file) for file in files], [1000, 7, 2])
+        self.assertRaises(ValueError, surface_number, 'fs_info.sav')
+        self.assertEqual(SurfaceCatalog(os.path.join(self.path, 'retek')).surfaces('EIM'), [])
+
+    def test_handler_selection(self):
+        with mock.patch.object(scat.os, 'scandir', wraps=os.scandir) as scandir:
+            self.handler.update_read_parameters(surfaces=[7, 1000, 5])
+            self.assertEqual(self.handler.return_surfaces(), [7, 1000])
+            self.handler.update_read_parameters(surfaces='0:10')
+            self.assertEqual(self.handler.return_surfaces(), [0, 2, 4, 6, 7, 8])
+            self.assertEqual(scandir.call_count, 1)
+            files = self.handler.return_surface_files()
+            self.handler.update_read_parameters(surfaces=files[3:5])
+            self.assertEqual(self.handler.return_surfaces(), [6, 7])
+            #a new file changes the directory, which is listed again
+            open(os.path.join(self.path, SURF_FILE % ('EIM', '1')), 'w').close()
+            os.utime(self.path, ns=(0, os.stat(self.path).st_mtime_ns + 10**9))
+            self.handler.update_read_parameters(surfaces='0:3')
+            self.assertEqual(self.handler.return_surfaces(), [0, 1, 2])
+            self.assertEqual(scandir.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)